@@ -0,0 +1,111 @@
+"""Partitioned, typed Parquet dataset output for historico.
+
+Instead of one historico.parquet with dd/mm/yy strings, the dataset layout
+writes historico/mes=YYYY-MM/loja=NNN/*.parquet: data_pedido is a real date,
+low-cardinality columns are dictionary-encoded and every row group carries
+min/max statistics, so readers filtering on month, store or date only touch
+the files and row groups they need.
+"""
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+HISTORICO_DATASET = 'historico'
+PARTITION_COLS = ('mes', 'loja')
+# Declared explicitly: hive inference would read loja '004' back as the integer 4
+PARTITION_SCHEMA = pa.schema([('mes', pa.string()), ('loja', pa.string())])
+
+COMPRESSIONS = ('snappy', 'zstd', 'gzip', 'brotli', 'lz4', 'none')
+DEFAULT_COMPRESSION = 'snappy'
+DEFAULT_ROW_GROUP_SIZE = 128 * 1024
+
+# months x stores can go well past pyarrow's default limit of 1024 partitions
+MAX_PARTITIONS = 100_000
+
+
+def parquet_compression(compression):
+    return None if compression in (None, 'none') else compression
+
+
+def _source_batches(source, batch_rows):
+    """Record batches from a DataFrame or from a Parquet file path."""
+    if isinstance(source, pd.DataFrame):
+        yield from pa.Table.from_pandas(source, preserve_index=False).to_batches(batch_rows)
+    else:
+        yield from pq.ParquetFile(source).iter_batches(batch_size=batch_rows)
+
+
+def _typed_batch(batch):
+    """Store data_pedido as a date, add the 'mes' partition key, dictionary-encode strings."""
+    columns = {}
+    for name, col in zip(batch.schema.names, batch.columns):
+        if name == 'data_pedido' and pa.types.is_timestamp(col.type):
+            col = pc.cast(col, pa.date32())
+        elif pa.types.is_string(col.type) or pa.types.is_large_string(col.type):
+            col = pc.dictionary_encode(col)
+        elif pa.types.is_dictionary(col.type):
+            # Categoricals come in with the narrowest index type, which can
+            # differ between batches
+            col = pc.cast(col, pa.dictionary(pa.int32(), col.type.value_type))
+        columns[name] = col
+    if 'data_pedido' in columns and pa.types.is_date(columns['data_pedido'].type):
+        mes = pc.strftime(pc.cast(columns['data_pedido'], pa.timestamp('s')), format='%Y-%m')
+    else:
+        mes = pa.nulls(batch.num_rows, pa.string())
+    columns['mes'] = mes
+    if 'loja' not in columns:
+        columns['loja'] = pa.nulls(batch.num_rows, pa.string())
+    elif pa.types.is_dictionary(columns['loja'].type):
+        # Partition values are read back as strings; keep the written type the same
+        columns['loja'] = pc.cast(columns['loja'], pa.string())
+    return pa.RecordBatch.from_pydict(columns)
+
+
+def open_historico_dataset(root):
+    """Open a dataset written by write_historico_dataset for lazy, filtered reads."""
+    return ds.dataset(root, format='parquet', partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'))
+
+
+def write_historico_dataset(source, root, compression=DEFAULT_COMPRESSION,
+                            row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """Write historico as a hive-partitioned dataset under root (month, then store).
+
+    source is the formatted historico, with data_pedido still a datetime,
+    either as a DataFrame or as the path of a Parquet file (chunked mode),
+    which is then converted batch by batch. The previous dataset is replaced
+    once the new one is complete. Returns the number of files written.
+    """
+    batches = (_typed_batch(b) for b in _source_batches(source, row_group_size))
+    first = next(batches, None)
+    if first is None:
+        return 0
+
+    def all_batches():
+        yield first
+        yield from batches
+
+    schema = first.schema
+    tmp_root = root + '.tmp'
+    shutil.rmtree(tmp_root, ignore_errors=True)
+
+    files = []
+    file_options = ds.ParquetFileFormat().make_write_options(
+        compression=parquet_compression(compression), write_statistics=True, use_dictionary=True)
+    ds.write_dataset(
+        all_batches(), tmp_root, schema=schema, format='parquet',
+        partitioning=ds.partitioning(PARTITION_SCHEMA, flavor='hive'),
+        file_options=file_options,
+        max_rows_per_group=row_group_size, min_rows_per_group=min(row_group_size, 16 * 1024),
+        max_partitions=MAX_PARTITIONS,
+        file_visitor=lambda f: files.append(f.path),
+    )
+
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    os.replace(tmp_root, root)
+    return len(files)
@@ -0,0 +1,234 @@
+"""What changed in mix since the previous run.
+
+Each run rewrites mix.parquet in the output folder, so before it does, the
+new mix is compared with the one still there. The comparison is keyed by
+codigo_interno and reports:
+
+- items added to or removed from mix;
+- items whose set of active stores (loja_ativa_mix) changed, with the
+  stores gained and lost; the same stores in another order are no change;
+- items whose estoque_cd moved by more than min_estoque boxes.
+
+Nothing is compared row by row: the snapshots are aligned on the key with
+one index lookup and each column is compared whole. Store lists of both
+snapshots are dictionary-encoded together (one hash table, in Arrow), so
+equal lists share a code; estoque_cd goes through hash_array. Only the
+items whose codes differ get their store lists split, and those are
+compared as hashed (item, store) pairs.
+
+The result, one row per changed item, is written to delta.parquet and
+delta.xlsx.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from formatters import join_by_key
+from writer import write_excel
+
+DELTA_PARQUET = 'delta.parquet'
+DELTA_EXCEL = 'delta.xlsx'
+DEFAULT_MIN_ESTOQUE = 0.0
+
+KEY = 'codigo_interno'
+SNAPSHOT_COLUMNS = (KEY, 'descricao', 'loja_ativa_mix', 'estoque_cd')
+
+ADDED, REMOVED, LOJAS, ESTOQUE, BOTH = 'incluido', 'removido', 'lojas', 'estoque_cd', 'lojas e estoque_cd'
+CHANGES = (ADDED, REMOVED, LOJAS, ESTOQUE, BOTH)
+
+DELTA_COLUMNS = ('codigo_interno', 'descricao', 'mudanca', 'lojas_antes', 'lojas_depois', 'lojas_incluidas',
+                 'lojas_removidas', 'estoque_cd_antes', 'estoque_cd_depois', 'estoque_cd_variacao')
+
+
+def read_snapshot(path):
+    """The compared columns of a previous mix.parquet, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    names = pq.read_schema(path).names
+    if KEY not in names:
+        return None
+    return pd.read_parquet(path, columns=[c for c in SNAPSHOT_COLUMNS if c in names])
+
+
+def _snapshot(df):
+    """The compared columns, one row per codigo_interno (the first, as in the lookups)."""
+    df = df[df[KEY].notna()].drop_duplicates(KEY)
+    columns = {KEY: df[KEY].to_numpy()}
+    columns['descricao'] = df['descricao'].reset_index(drop=True) if 'descricao' in df else None
+    columns['lojas'] = pa.array(df['loja_ativa_mix'], type=pa.string(), from_pandas=True) \
+        if 'loja_ativa_mix' in df else None
+    columns['estoque'] = pd.to_numeric(df['estoque_cd'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan) \
+        if 'estoque_cd' in df else None
+    return columns
+
+
+def _codes(before, after):
+    """Dictionary codes of two string arrays encoded together: equal strings get equal codes."""
+    encoded = pa.chunked_array([before, after]).dictionary_encode(null_encoding='encode').combine_chunks()
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    return codes[:len(before)], codes[len(before):]
+
+
+def _stores(lojas):
+    """(position, store) pairs of hyphen-joined store lists."""
+    lists = pc.split_pattern(lojas, '-')
+    positions = pc.list_parent_indices(lists).to_numpy()
+    stores = pc.list_flatten(lists).to_numpy(zero_copy_only=False)
+    keep = stores != ''
+    return positions[keep], stores[keep]
+
+
+def _pair_hashes(positions, stores):
+    return pd.util.hash_pandas_object(pd.DataFrame({'position': positions, 'store': stores}), index=False).to_numpy()
+
+
+def _joined(positions, stores, n):
+    """Stores of each of n positions joined by hyphens (None where there are none)."""
+    out = np.full(n, None, dtype=object)
+    if len(positions):
+        keys, _, joined = join_by_key(pd.Series(positions), pd.Series(stores, dtype=object))
+        out[keys] = joined.to_numpy(zero_copy_only=False)
+    return out
+
+
+def store_changes(before, after):
+    """Stores gained and lost between two aligned Arrow arrays of hyphen-joined store lists.
+
+    Returns (changed, gained, lost): a boolean array, and the gained and lost
+    stores of each position joined by hyphens.
+    """
+    before_positions, before_stores = _stores(before)
+    after_positions, after_stores = _stores(after)
+    before_hashes = _pair_hashes(before_positions, before_stores)
+    after_hashes = _pair_hashes(after_positions, after_stores)
+    gained = ~np.isin(after_hashes, before_hashes)
+    lost = ~np.isin(before_hashes, after_hashes)
+
+    changed = np.zeros(len(after), dtype=bool)
+    changed[after_positions[gained]] = True
+    changed[before_positions[lost]] = True
+    return (changed, _joined(after_positions[gained], after_stores[gained], len(after)),
+            _joined(before_positions[lost], before_stores[lost], len(after)))
+
+
+def compare_snapshots(previous, current, min_estoque=DEFAULT_MIN_ESTOQUE):
+    """One row per item added, removed or changed from the previous mix to the current one.
+
+    Both are DataFrames with codigo_interno and any of descricao,
+    loja_ativa_mix and estoque_cd; a column missing from either side is not
+    compared. See DELTA_COLUMNS for the result.
+    """
+    before, after = _snapshot(previous), _snapshot(current)
+    # Position of each current item in the previous snapshot; -1 for new items
+    in_before = pd.Index(before[KEY]).get_indexer(pd.Index(after[KEY]))
+    kept = in_before >= 0
+    after_rows, before_rows = np.flatnonzero(kept), in_before[kept]
+    added_rows = np.flatnonzero(~kept)
+    still_there = np.zeros(len(before[KEY]), dtype=bool)
+    still_there[before_rows] = True
+    removed_rows = np.flatnonzero(~still_there)
+    n = len(after_rows)
+
+    lojas_changed = np.zeros(n, dtype=bool)
+    gained = np.full(n, None, dtype=object)
+    lost = np.full(n, None, dtype=object)
+    if before['lojas'] is not None and after['lojas'] is not None:
+        # Equal codes: same text, so same stores; only the rest are split and compared
+        before_codes, after_codes = _codes(before['lojas'], after['lojas'])
+        differ = np.flatnonzero(before_codes[before_rows] != after_codes[after_rows])
+        changed, gained[differ], lost[differ] = store_changes(before['lojas'].take(before_rows[differ]),
+                                                              after['lojas'].take(after_rows[differ]))
+        lojas_changed[differ] = changed
+
+    estoque_changed = np.zeros(n, dtype=bool)
+    variation = np.full(n, np.nan)
+    if before['estoque'] is not None and after['estoque'] is not None:
+        estoque_before, estoque_after = before['estoque'][before_rows], after['estoque'][after_rows]
+        differ = pd.util.hash_array(estoque_before) != pd.util.hash_array(estoque_after)
+        variation = estoque_after - estoque_before
+        # A value appearing or disappearing always counts; a difference only above min_estoque
+        appeared = np.isnan(estoque_before) != np.isnan(estoque_after)
+        estoque_changed = differ & (appeared | (np.abs(variation) > min_estoque))
+
+    def column(side, name, rows):
+        values = side[name]
+        if values is None:
+            return np.full(len(rows), None, dtype=object)
+        if isinstance(values, pa.Array):
+            return values.take(rows).to_numpy(zero_copy_only=False)
+        return values.iloc[rows].to_numpy(dtype=object)
+
+    def estoque(side, rows):
+        values = side['estoque']
+        return values[rows] if values is not None else np.full(len(rows), np.nan)
+
+    changed = np.flatnonzero(lojas_changed | estoque_changed)
+    rows = after_rows[changed]
+    kinds = np.where(lojas_changed[changed] & estoque_changed[changed], BOTH,
+                     np.where(lojas_changed[changed], LOJAS, ESTOQUE))
+    lojas_rows = lojas_changed[changed]
+    frames = [
+        pd.DataFrame({
+            'codigo_interno': after[KEY][added_rows], 'descricao': column(after, 'descricao', added_rows),
+            'mudanca': ADDED, 'lojas_depois': column(after, 'lojas', added_rows),
+            'estoque_cd_depois': estoque(after, added_rows),
+        }),
+        pd.DataFrame({
+            'codigo_interno': before[KEY][removed_rows], 'descricao': column(before, 'descricao', removed_rows),
+            'mudanca': REMOVED, 'lojas_antes': column(before, 'lojas', removed_rows),
+            'estoque_cd_antes': estoque(before, removed_rows),
+        }),
+        pd.DataFrame({
+            'codigo_interno': after[KEY][rows], 'descricao': column(after, 'descricao', rows), 'mudanca': kinds,
+            'lojas_antes': np.where(lojas_rows, column(before, 'lojas', before_rows[changed]), None),
+            'lojas_depois': np.where(lojas_rows, column(after, 'lojas', rows), None),
+            'lojas_incluidas': gained[changed], 'lojas_removidas': lost[changed],
+            'estoque_cd_antes': estoque(before, before_rows[changed]),
+            'estoque_cd_depois': estoque(after, rows),
+            'estoque_cd_variacao': np.where(estoque_changed[changed], variation[changed], np.nan),
+        }),
+    ]
+    delta = pd.concat([f for f in frames if len(f)] or frames[:1], ignore_index=True).reindex(columns=DELTA_COLUMNS)
+    for name in ('descricao', 'lojas_antes', 'lojas_depois', 'lojas_incluidas', 'lojas_removidas'):
+        values = delta[name].astype(object)
+        delta[name] = values.where(values.notna() & (values != ''), None)
+    for name in ('estoque_cd_antes', 'estoque_cd_depois', 'estoque_cd_variacao'):
+        delta[name] = delta[name].astype('float64')
+    delta['mudanca'] = pd.Categorical(delta['mudanca'], categories=CHANGES)
+    return delta.sort_values(['mudanca', 'codigo_interno'], kind='stable', ignore_index=True)
+
+
+def write_delta(df_mix, snapshot, output_dir, log=print, min_estoque=DEFAULT_MIN_ESTOQUE, compression=None):
+    """Compare df_mix with snapshot (the previous mix.parquet) and save the delta files.
+
+    Must run before mix.parquet is rewritten. Returns the delta DataFrame, or
+    None when there is no previous snapshot. Never fatal: an unreadable or
+    incompatible snapshot is logged and yields None too, so the run still
+    writes its outputs (and a fresh mix.parquet for the next comparison);
+    delta files left by an earlier run are removed rather than kept stale.
+    """
+    log("⏳ Comparando com a execução anterior...")
+    try:
+        previous = read_snapshot(snapshot)
+        if previous is None:
+            log("  ⚠ Nenhuma execução anterior nesta pasta, delta não gerado")
+            return None
+        delta = compare_snapshots(previous, df_mix, min_estoque)
+        counts = delta['mudanca'].value_counts()
+        log(f"  ✓ {counts[ADDED]} itens incluídos, {counts[REMOVED]} removidos, "
+            f"{counts[LOJAS] + counts[BOTH]} com lojas alteradas, "
+            f"{counts[ESTOQUE] + counts[BOTH]} com estoque_cd alterado")
+        delta.to_parquet(os.path.join(output_dir, DELTA_PARQUET), index=False, compression=compression)
+        write_excel(os.path.join(output_dir, DELTA_EXCEL), {'delta': delta})
+    except Exception as e:
+        log(f"  ⚠ delta não gerado: {e}")
+        for name in (DELTA_PARQUET, DELTA_EXCEL):
+            if os.path.exists(os.path.join(output_dir, name)):
+                os.remove(os.path.join(output_dir, name))
+        return None
+    log(f"  ✓ Salvo: {DELTA_PARQUET} e {DELTA_EXCEL}")
+    return delta
@@ -0,0 +1,611 @@
+"""Processing engine shared by ap.py, the GUI and the command line.
+
+The pipeline is split in stages (load, format, consolidate lojas, estoque_cd,
+write) so each can be run, timed or replaced on its own. Every stage takes a
+`log` callable so the GUI can route messages to its log widget while the
+command line simply prints them.
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from chunked import DEFAULT_CHUNK_ROWS, iter_parquet_chunks, stream_historico
+from dataset import COMPRESSIONS, DEFAULT_COMPRESSION, DEFAULT_ROW_GROUP_SIZE, HISTORICO_DATASET, parquet_compression, \
+    write_historico_dataset
+from delta import DEFAULT_MIN_ESTOQUE, DELTA_EXCEL, DELTA_PARQUET, write_delta
+from formatters import EAN_WIDTH, LOJA_WIDTH, ean_check_valid, join_by_key, load_situacao_map, map_situacao_series, \
+    pad_codes
+from historico_store import HISTORICO_STORE, ingest
+from incremental import NoCache, StageCache
+from key_index import KeyIndex
+from loader import SHEETS, load_sheets, sheet_keys
+from profiling import PROFILERS, RunReport, launch_time, startup_info
+from progress import Cancelled, NoProgress
+from schema import apply_schemas
+from sheet_cache import DEFAULT_MAX_MB, SheetCache
+from wms import LayoutCache, resolve_layout, summarize_wms
+from writer import DATE_FORMAT, write_excel
+
+OUTPUT_EXCEL = 'unificador_processado.xlsx'
+MIX_PARQUET = 'mix.parquet'
+HISTORICO_PARQUET = 'historico.parquet'
+LOJAS_PARQUET = 'lojas_ativas.parquet'
+WMS_SUMMARY_PARQUET = 'wms_resumo.parquet'
+
+WORKBOOK_EXTENSIONS = ('.xlsm', '.xlsx')
+# Workbooks written by a run, never inputs
+OUTPUT_WORKBOOKS = {OUTPUT_EXCEL, DELTA_EXCEL}
+
+
+def load(input_file, log=print, sheets=SHEETS, progress=None, sheet_cache=None, keys=None):
+    """Read mix, item_ativo, wms and historico (or the given sheets) from the workbook.
+
+    With a sheet_cache (see sheet_cache.py), sheets unchanged since an
+    earlier run are mapped from it instead of parsed, and the ones parsed
+    now are added to it. keys are the loader.sheet_keys of input_file, if
+    already computed.
+    """
+    log("⏳ Carregando planilhas...")
+    start = time.perf_counter()
+    frames = sheet_cache.get(input_file, sheets, log, keys) if sheet_cache else {}
+    missing = [s for s in sheets if s not in frames]
+    if missing:
+        loaded, _ = load_sheets(input_file, missing, log=log, progress=progress)
+        if sheet_cache:
+            sheet_cache.put(input_file, loaded, log, keys)
+        frames.update(loaded)
+    log(f"  ✓ Planilhas carregadas em {time.perf_counter() - start:.2f}s")
+    return {s: frames[s] for s in sheets}
+
+
+def format_mix(df_mix, log=print, validate_ean=False):
+    """Pad 'codigo_ean' to 13 digits (14-digit EANs are kept whole).
+
+    With validate_ean=True, unparseable EANs are left blank instead of
+    becoming '0000000000000', and an 'ean_valido' column flags codes whose
+    check digit doesn't match.
+    """
+    log("⏳ Formatando 'codigo_ean'...")
+    if 'codigo_ean' in df_mix.columns:
+        if validate_ean:
+            valid = ean_check_valid(df_mix['codigo_ean'])
+            df_mix['codigo_ean'] = pad_codes(df_mix['codigo_ean'], EAN_WIDTH, fill=None)
+            df_mix['ean_valido'] = valid
+            if not valid.all():
+                log(f"  ⚠ {(~valid).sum()} códigos EAN inválidos (coluna 'ean_valido')")
+        else:
+            df_mix['codigo_ean'] = pad_codes(df_mix['codigo_ean'], EAN_WIDTH)
+        log("  ✓ Códigos EAN formatados para 13 dígitos")
+    else:
+        log("  ⚠ Coluna 'codigo_ean' não encontrada")
+    return df_mix
+
+
+def format_historico(df_historico, log=print, situacao_map=None, display_dates=True):
+    """Format 'loja', 'data_pedido' and 'situacao' in historico.
+
+    situacao_map overrides formatters.SITUACAO_MAP (status code -> label).
+    With display_dates=False, data_pedido is parsed but kept as a datetime
+    (the Excel writer still shows it as dd/mm/yy) instead of becoming text.
+    """
+    if df_historico.empty:
+        return df_historico
+
+    if 'loja' in df_historico.columns:
+        log("⏳ Formatando 'loja' no histórico...")
+        df_historico['loja'] = pad_codes(df_historico['loja'], LOJA_WIDTH, as_category=True)
+        log("  ✓ Lojas formatadas para 3 dígitos")
+
+    if 'data_pedido' in df_historico.columns:
+        log("⏳ Formatando 'data_pedido' no histórico...")
+        df_historico['data_pedido'] = pd.to_datetime(df_historico['data_pedido'], errors='coerce')
+        if display_dates:
+            df_historico['data_pedido'] = df_historico['data_pedido'].dt.strftime('%d/%m/%y')
+        log("  ✓ Datas formatadas (DD/MM/AA)")
+
+    if 'situacao' in df_historico.columns:
+        log("⏳ Mapeando 'situacao' no histórico...")
+        df_historico['situacao'] = map_situacao_series(df_historico['situacao'], situacao_map)
+        log("  ✓ Situações mapeadas")
+
+    return df_historico
+
+
+def build_lojas_ativas(df_ativo):
+    """One row per codigo_interno with its active stores, in sheet order.
+
+    'loja_ativa_mix_calculated' holds them joined by hyphens ('002-003-004')
+    and 'lojas' the same stores as a list of numeric ids.
+    """
+    active_items = df_ativo.loc[df_ativo['status'] == 'A', ['codigo_interno', 'loja']]
+    lojas = pad_codes(active_items['loja'], LOJA_WIDTH, as_category=True)
+    keys, lists, joined = join_by_key(active_items['codigo_interno'], lojas)
+    ids = pa.ListArray.from_arrays(lists.offsets, pc.cast(lists.values, pa.int16()))
+    return pd.DataFrame({
+        'codigo_interno': keys,
+        'loja_ativa_mix_calculated': joined.to_pandas().array,
+        'lojas': pd.arrays.ArrowExtensionArray(ids),
+    })
+
+
+def index_mix(df_mix, log=print):
+    """Build the codigo_interno KeyIndex of mix, warning about repeated codes."""
+    index = KeyIndex(df_mix['codigo_interno'])
+    if index.n_duplicates:
+        log(f"  ⚠ {index.n_duplicates} linhas do mix repetem um codigo_interno "
+            f"(ex.: {', '.join(map(str, index.duplicate_keys()))})")
+    return index
+
+
+def consolidate_lojas(df_mix, df_ativo, log=print, cache=None, lojas_parquet=None, index=None, key=None):
+    """Fill mix 'loja_ativa_mix' with the hyphen-joined active stores of each item.
+
+    If lojas_parquet is given, also write codigo_interno plus the list of
+    active store ids there, so consumers can test "item active in store X"
+    without parsing the joined string. index is the KeyIndex of mix
+    (see index_mix); the column is attached by lookup, without a merge.
+    key is the sheet key of item_ativo for the cache (see StageCache.run).
+    """
+    log("⏳ Processando 'loja_ativa_mix'...")
+    lojas_ativas = (cache or NoCache()).run('lojas_ativas', df_ativo, build_lojas_ativas, key=key)
+
+    if lojas_parquet:
+        # Without the pandas metadata, which pd.read_parquet can't map back to a list dtype
+        table = pa.Table.from_pandas(lojas_ativas[['codigo_interno', 'lojas']], preserve_index=False)
+        pq.write_table(table.replace_schema_metadata(), lojas_parquet)
+        log(f"  ✓ Salvo: {os.path.basename(lojas_parquet)}")
+
+    if index is None:
+        index = index_mix(df_mix, log)
+    df_mix['loja_ativa_mix'] = index.lookup(lojas_ativas['codigo_interno'], lojas_ativas['loja_ativa_mix_calculated'])
+    log("  ✓ Lojas ativas consolidadas")
+    return df_mix
+
+
+def compute_estoque_cd(df_mix, df_wms, log=print, cache=None, index=None, wms_layout=None, summary_parquet=None,
+                       layouts=None, key=None):
+    """Sum WMS stock per item and convert it to boxes using 'embalagem'.
+
+    index is the KeyIndex of mix (see index_mix). wms_layout is the WMS
+    layout config (a dict or JSON path, see wms.py); the columns it leaves
+    out are detected, through layouts (a wms.LayoutCache) when given. If
+    summary_parquet is given, every aggregate of the layout is computed and
+    the per-item WMS summary is also written there. key is the sheet key of
+    wms for the cache (see StageCache.run).
+    """
+    log("⏳ Processando 'estoque_cd'...")
+    layout = resolve_layout(df_wms, wms_layout, log, layouts)
+    if layout is None:
+        log("  ⚠ Coluna de quantidade não identificada no WMS")
+        return df_mix
+
+    log(f"  ✓ Coluna de quantidade encontrada: '{layout['qty_column']}'")
+    if layout['filters']:
+        log(f"  ✓ Filtros do layout: {len(layout['filters'])}")
+    # Only the sum is needed for mix; the other aggregates just for the summary file
+    aggregates = layout['aggregates'] if summary_parquet else ['sum']
+    params = {**{k: str(v) if k.endswith('_column') else v for k, v in layout.items()}, 'aggregates': aggregates}
+    wms_sum = (cache or NoCache()).run('wms_summary', df_wms, lambda df: summarize_wms(df, layout, aggregates),
+                                       params, key)
+    if summary_parquet:
+        wms_sum.to_parquet(summary_parquet, index=False)
+        log(f"  ✓ Salvo: {os.path.basename(summary_parquet)} ({len(wms_sum)} itens)")
+
+    # Re-added as the last column, where the merge this replaced used to put it
+    if 'total_estoque' in df_mix.columns:
+        del df_mix['total_estoque']
+
+    if index is None:
+        index = index_mix(df_mix, log)
+    total = index.lookup(wms_sum['codigo_interno'], wms_sum['total_estoque'])
+    df_mix['total_estoque'] = pd.to_numeric(pd.Series(total, index=df_mix.index), errors='coerce').fillna(0)
+    embalagem = pd.to_numeric(df_mix['embalagem'], errors='coerce')
+    if embalagem.isna().any():
+        examples = ', '.join(map(str, df_mix.loc[embalagem.isna(), 'codigo_interno'].head(5)))
+        log(f"  ⚠ {embalagem.isna().sum()} itens sem 'embalagem' válida (ex.: {examples}); "
+            "estoque_cd calculado com embalagem 1")
+    df_mix['embalagem'] = embalagem.fillna(1) # Avoid div by zero
+    if layout['unit'] == 'boxes':
+        df_mix['estoque_cd'] = df_mix['total_estoque']
+    else:
+        df_mix['estoque_cd'] = df_mix['total_estoque'] / df_mix['embalagem']
+    log("  ✓ Estoque CD calculado (em caixas)")
+    return df_mix
+
+
+def write_outputs(df_mix, df_historico, output_dir, log=print, excel_writer='streaming', historico_parquet=None,
+                  parquet_layout='file', compression=DEFAULT_COMPRESSION, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+                  historico_store=False, progress=None):
+    """Write the Excel workbook and the Parquet files; returns the Excel path.
+
+    excel_writer='streaming' writes rows in chunks through writer.write_excel;
+    'pandas' builds the workbook in memory with pd.ExcelWriter as before.
+    historico_parquet is the historico file already written in chunked mode;
+    df_historico is then an iterable of chunks read back from it.
+
+    parquet_layout='file' writes historico.parquet as a single file;
+    'dataset' writes the partitioned, typed historico/ dataset instead (see
+    dataset.py). Either one removes the other layout's historico left by an
+    earlier run, so query.py never reads a stale copy. compression and row_group_size apply to every Parquet output.
+    historico_store=True also merges new or changed historico rows into the
+    append-only store in historico_store/ (see historico_store.py).
+    progress (see progress.py) follows the streaming Excel write; if the run
+    is cancelled there, the partial workbook is removed.
+    """
+    progress = progress or NoProgress()
+    output_file = os.path.join(output_dir, OUTPUT_EXCEL)
+
+    log("⏳ Salvando arquivo Excel...")
+    sheets = {'mix': df_mix}
+    if historico_parquet or not df_historico.empty:
+        sheets['historico'] = df_historico
+    else:
+        log("  ⚠ Planilha 'historico' vazia, não será salva")
+    if excel_writer == 'streaming' or historico_parquet:
+        try:
+            write_excel(output_file, sheets, progress=progress.advance)
+        except Cancelled:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            raise
+    else:
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+            for name, df in sheets.items():
+                df.to_excel(writer, sheet_name=name, index=False)
+                # Dates shown dd/mm/yy, as write_excel does (historico keeps them typed in the dataset
+                # layout); the openpyxl writer ignores ExcelWriter's date_format, so it is set per cell
+                ws = writer.sheets[name]
+                for i, col in enumerate(df.columns, start=1):
+                    if pd.api.types.is_datetime64_any_dtype(df[col]):
+                        for (cell,) in ws.iter_rows(min_row=2, min_col=i, max_col=i):
+                            cell.number_format = DATE_FORMAT
+    log(f"  ✓ Salvo: {os.path.basename(output_file)}")
+
+    log("⏳ Salvando arquivos Parquet...")
+    parquet_options = {'compression': parquet_compression(compression), 'row_group_size': row_group_size}
+    try:
+        df_mix.to_parquet(os.path.join(output_dir, MIX_PARQUET), index=False, **parquet_options)
+        log(f"  ✓ Salvo: {MIX_PARQUET}")
+
+        if historico_store and (historico_parquet or not df_historico.empty):
+            ingest(os.path.join(output_dir, HISTORICO_STORE), historico_parquet or df_historico, log=log)
+
+        if parquet_layout == 'dataset':
+            if historico_parquet or not df_historico.empty:
+                files = write_historico_dataset(historico_parquet or df_historico,
+                                                os.path.join(output_dir, HISTORICO_DATASET),
+                                                compression, row_group_size)
+                log(f"  ✓ Salvo: {HISTORICO_DATASET}/ ({files} arquivos, particionado por mês e loja)")
+                stale = os.path.join(output_dir, HISTORICO_PARQUET)
+                # Also the staging file of chunked mode
+                if os.path.exists(stale):
+                    os.remove(stale)
+        else:
+            if historico_parquet:
+                log(f"  ✓ Salvo: {HISTORICO_PARQUET} (em blocos)")
+            elif not df_historico.empty:
+                df_historico.to_parquet(os.path.join(output_dir, HISTORICO_PARQUET), index=False, **parquet_options)
+                log(f"  ✓ Salvo: {HISTORICO_PARQUET}")
+            if historico_parquet or not df_historico.empty:
+                shutil.rmtree(os.path.join(output_dir, HISTORICO_DATASET), ignore_errors=True)
+    except Exception as e:
+        log(f"  ⚠ Erro ao salvar Parquet: {e}")
+        log("  Verifique se 'pyarrow' está instalado (pip install pyarrow).")
+
+    return output_file
+
+
+def process_workbook(input_file, output_dir=None, log=print, incremental=False, validate_ean=False,
+                     lojas_parquet=False, excel_writer='streaming', chunked=False,
+                     chunk_rows=DEFAULT_CHUNK_ROWS, max_memory_mb=None, parquet_layout='file',
+                     compression=DEFAULT_COMPRESSION, row_group_size=DEFAULT_ROW_GROUP_SIZE, historico_store=False,
+                     profile=None, progress=None, sheet_cache=True, sheet_cache_mb=DEFAULT_MAX_MB,
+                     wms_layout=None, wms_summary=False, situacao_map=None, delta=True,
+                     delta_min_estoque=DEFAULT_MIN_ESTOQUE, startup=None):
+    """Run the whole pipeline on one workbook and return the Excel output path.
+
+    Outputs go next to the input file unless output_dir is given. With
+    incremental=True, stages whose input sheet is unchanged since the last
+    run in output_dir reuse their cached result (see incremental.py);
+    item_ativo and historico aren't even read when their stage is reused.
+    validate_ean is passed on to format_mix; lojas_parquet=True also writes
+    the active stores of each item as a list column to lojas_ativas.parquet.
+    excel_writer selects the Excel writer (see write_outputs).
+
+    chunked=True never loads historico whole: it is streamed in batches of
+    up to chunk_rows rows (fewer if max_memory_mb caps the batch working set)
+    straight to historico.parquet; see chunked.py.
+
+    parquet_layout, compression, row_group_size and historico_store are passed
+    on to write_outputs; with the 'dataset' layout historico dates stay typed.
+
+    Every stage is timed and measured (see profiling.py); the figures are
+    logged as a table and saved to run_report.json in output_dir. profile
+    lists extra profilers to run: 'cprofile' and/or 'tracemalloc'.
+
+    progress is a progress.Progress the stages report to; cancelling it
+    raises progress.Cancelled out of the stage in progress.
+
+    sheet_cache=True reuses sheets parsed by earlier runs, as long as the
+    sheet itself is unchanged (see sheet_cache.py); the cache is kept under
+    sheet_cache_mb MB.
+
+    wms_layout is the WMS layout config (see wms.py); wms_summary=True also
+    writes every WMS aggregate per item to wms_resumo.parquet. The detected
+    WMS layout is cached with the sheets unless sheet_cache is False.
+
+    situacao_map (a dict or the path of a JSON file) relabels historico
+    status codes on top of formatters.SITUACAO_MAP; see load_situacao_map.
+
+    delta=True compares mix with the mix.parquet left in output_dir by the
+    previous run and writes what changed to delta.parquet and delta.xlsx;
+    estoque_cd changes of up to delta_min_estoque boxes are left out (see
+    delta.py).
+
+    startup holds the program's startup times (see profiling.startup_info),
+    copied into run_report.json.
+    """
+    progress = progress or NoProgress()
+    situacao_map = load_situacao_map(situacao_map)
+    output_dir = output_dir or os.path.dirname(os.path.abspath(input_file))
+    os.makedirs(output_dir, exist_ok=True)
+    cache = StageCache(output_dir, log) if incremental else NoCache()
+    report = RunReport(input_file, {'incremental': incremental, 'chunked': chunked, 'excel_writer': excel_writer,
+                                    'parquet_layout': parquet_layout, 'compression': compression}, profile,
+                       startup)
+
+    display_dates = parquet_layout != 'dataset'
+    historico_stage = 'historico' if display_dates else 'historico_typed'
+    historico_params = {'situacao_map': sorted(situacao_map.items())}
+    with report.stage('load') as stage:
+        progress.start('load')
+        sheets = [s for s in SHEETS if s != 'historico'] if chunked else list(SHEETS)
+        # Keyed on the raw sheet XML, so unchanged sheets are known before any is parsed
+        keys = sheet_keys(input_file, sheets) if incremental or sheet_cache else {}
+        # Sheets read by nothing but a stage whose snapshot is still fresh are skipped
+        reused = [sheet for sheet, name, params in (('item_ativo', 'lojas_ativas', None),
+                                                    ('historico', historico_stage, historico_params))
+                  if sheet in sheets and cache.fresh(name, keys.get(sheet), params)]
+        frames = load(input_file, log, [s for s in sheets if s not in reused], progress,
+                      SheetCache(max_mb=sheet_cache_mb) if sheet_cache else None, keys)
+        for sheet in reused:
+            log(f"  ↺ '{sheet}' sem alterações, não foi lida")
+        frames, stage['schema_violations'] = apply_schemas(frames, log)
+        stage['rows_out'] = sum(len(df) for df in frames.values())
+    df_mix = frames['mix']
+    log("")
+
+    def sheet_rows(sheet):
+        return len(frames[sheet]) if sheet in frames else 0
+
+    with report.stage('format_mix', len(df_mix)) as stage:
+        progress.start('format_mix', len(df_mix))
+        df_mix = format_mix(df_mix, log, validate_ean)
+        stage['rows_out'] = len(df_mix)
+    historico_parquet = None
+    historico_rows = 0
+    if chunked:
+        with report.stage('format_historico') as stage:
+            progress.start('format_historico')
+            log("⏳ Processando 'historico' em blocos...")
+            historico_parquet = os.path.join(output_dir, HISTORICO_PARQUET)
+            rows, batch_rows = stream_historico(input_file, historico_parquet,
+                                                lambda df: format_historico(df, lambda msg: None, situacao_map,
+                                                                            display_dates),
+                                                log, chunk_rows, max_memory_mb, progress)
+            if rows:
+                log("  ✓ Histórico formatado (loja, data_pedido, situacao)")
+                df_historico = iter_parquet_chunks(historico_parquet, batch_rows)
+            else:
+                log("  ⚠ Planilha 'historico' não encontrada")
+                df_historico = pd.DataFrame()
+                historico_parquet = None
+            historico_rows = stage['rows_in'] = stage['rows_out'] = rows
+    else:
+        with report.stage('format_historico', sheet_rows('historico')) as stage:
+            progress.start('format_historico', sheet_rows('historico'))
+            df_historico = cache.run(historico_stage, frames.get('historico'),
+                                     lambda df: format_historico(df, log, situacao_map, display_dates),
+                                     historico_params, keys.get('historico'))
+            historico_rows = stage['rows_out'] = len(df_historico)
+    log("")
+
+    with report.stage('consolidate_lojas', len(df_mix) + sheet_rows('item_ativo')) as stage:
+        progress.start('consolidate_lojas')
+        index = index_mix(df_mix, log)
+        stage['duplicate_keys'] = index.n_duplicates
+        df_mix = consolidate_lojas(df_mix, frames.get('item_ativo'), log, cache,
+                                   os.path.join(output_dir, LOJAS_PARQUET) if lojas_parquet else None, index,
+                                   keys.get('item_ativo'))
+        stage['rows_out'] = len(df_mix)
+    log("")
+
+    with report.stage('estoque_cd', len(df_mix) + len(frames['wms'])) as stage:
+        progress.start('estoque_cd')
+        df_mix = compute_estoque_cd(df_mix, frames['wms'], log, cache, index, wms_layout,
+                                    os.path.join(output_dir, WMS_SUMMARY_PARQUET) if wms_summary else None,
+                                    LayoutCache() if sheet_cache else None, keys.get('wms'))
+        stage['rows_out'] = len(df_mix)
+    log("")
+
+    if delta:
+        with report.stage('delta', len(df_mix)) as stage:
+            progress.start('delta')
+            changes = write_delta(df_mix, os.path.join(output_dir, MIX_PARQUET), output_dir, log, delta_min_estoque,
+                                  parquet_compression(compression))
+            stage['rows_out'] = 0 if changes is None else len(changes)
+        log("")
+
+    with report.stage('write', len(df_mix) + historico_rows) as stage:
+        progress.start('write', len(df_mix) + historico_rows)
+        output_file = write_outputs(df_mix, df_historico, output_dir, log, excel_writer, historico_parquet,
+                                    parquet_layout, compression, row_group_size, historico_store, progress)
+        stage['rows_out'] = len(df_mix) + historico_rows
+    cache.save()
+    log("")
+    report.finish(output_dir, log)
+    return output_file
+
+
+def list_workbooks(input_dir):
+    """Workbooks in input_dir, skipping Excel lock files and our own outputs."""
+    names = []
+    for name in sorted(os.listdir(input_dir)):
+        if name.startswith('~$') or name in OUTPUT_WORKBOOKS:
+            continue
+        if name.lower().endswith(WORKBOOK_EXTENSIONS):
+            names.append(os.path.join(input_dir, name))
+    return names
+
+
+def _process_one(input_file, output_dir, options):
+    # Runs inside a pool worker: prefix messages so interleaved output stays readable
+    prefix = f"[{os.path.basename(input_file)}] "
+    return process_workbook(input_file, output_dir, log=lambda msg: print(prefix + msg if msg else msg, flush=True),
+                            **options)
+
+
+def process_directory(input_dir, output_dir=None, workers=None, log=print, **options):
+    """Process every workbook in input_dir, one workbook per worker process.
+
+    Each workbook writes to its own subfolder of output_dir (named after the
+    workbook) so the fixed output file names don't collide. Returns a dict
+    mapping input path to the Excel output path, or to the exception raised.
+    Extra keyword options are passed on to process_workbook.
+    """
+    output_dir = output_dir or input_dir
+    workbooks = list_workbooks(input_dir)
+    if not workbooks:
+        log(f"  ⚠ Nenhuma planilha encontrada em {input_dir}")
+        return {}
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for input_file in workbooks:
+            stem = os.path.splitext(os.path.basename(input_file))[0]
+            futures[pool.submit(_process_one, input_file, os.path.join(output_dir, stem), options)] = input_file
+        for future in as_completed(futures):
+            input_file = futures[future]
+            try:
+                results[input_file] = future.result()
+                log(f"✓ {os.path.basename(input_file)} -> {results[input_file]}")
+            except Exception as e:
+                results[input_file] = e
+                log(f"✗ {os.path.basename(input_file)}: {e}")
+    return results
+
+
+def main(argv=None):
+    # Imports done: how long the command line took to get here
+    ready_s = time.time() - launch_time()
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['query']:
+        # Imported here: query builds on this module
+        from query import main as query_main
+        return query_main(argv[1:])
+
+    parser = argparse.ArgumentParser(description="Processa planilhas do Unificador sem interface gráfica.")
+    parser.add_argument('input', help="planilha .xlsm/.xlsx ou diretório com várias planilhas "
+                                      "(ou 'query' para consultar saídas já processadas; veja query.py)")
+    parser.add_argument('-o', '--output', help="diretório de saída (padrão: o mesmo da entrada)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="processos em paralelo ao processar um diretório (padrão: número de CPUs)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="reaproveita etapas cujas planilhas de entrada não mudaram desde a última execução")
+    parser.add_argument('--validate-ean', action='store_true',
+                        help="marca EANs com dígito verificador inválido em vez de completá-los com zeros")
+    parser.add_argument('--lojas-parquet', action='store_true',
+                        help=f"salva também {LOJAS_PARQUET} com a lista de lojas ativas de cada item")
+    parser.add_argument('--excel-writer', choices=('streaming', 'pandas'), default='streaming',
+                        help="'streaming' grava o Excel em blocos com memória constante (padrão); "
+                             "'pandas' monta a planilha inteira em memória")
+    parser.add_argument('--chunked', action='store_true',
+                        help="processa o histórico em blocos, sem carregá-lo inteiro na memória")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help=f"máximo de linhas por bloco no modo --chunked (padrão: {DEFAULT_CHUNK_ROWS})")
+    parser.add_argument('--max-memory-mb', type=int, default=None,
+                        help="teto de memória (MB) para cada bloco do histórico no modo --chunked")
+    parser.add_argument('--parquet-layout', choices=('file', 'dataset'), default='file',
+                        help=f"'dataset' grava o histórico em {HISTORICO_DATASET}/ particionado por mês e loja, "
+                             "com datas tipadas, em vez de um único historico.parquet")
+    parser.add_argument('--compression', choices=COMPRESSIONS, default=DEFAULT_COMPRESSION,
+                        help=f"compressão dos arquivos Parquet (padrão: {DEFAULT_COMPRESSION})")
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"linhas por row group nos arquivos Parquet (padrão: {DEFAULT_ROW_GROUP_SIZE})")
+    parser.add_argument('--historico-store', action='store_true',
+                        help=f"acumula o histórico em {HISTORICO_STORE}/, gravando só as linhas novas ou alteradas")
+    parser.add_argument('--profile', action='append', choices=PROFILERS, default=[],
+                        help="perfilamento detalhado: 'cprofile' salva run_profile.prof, 'tracemalloc' mede "
+                             "as alocações de cada etapa (pode ser repetido)")
+    parser.add_argument('--no-sheet-cache', action='store_true',
+                        help="não usa o cache de planilhas já lidas em execuções anteriores")
+    parser.add_argument('--sheet-cache-mb', type=int, default=DEFAULT_MAX_MB,
+                        help=f"tamanho máximo do cache de planilhas em MB (padrão: {DEFAULT_MAX_MB})")
+    parser.add_argument('--clear-sheet-cache', action='store_true',
+                        help="apaga o cache de planilhas antes de processar")
+    parser.add_argument('--wms-layout', metavar='JSON',
+                        help="layout do WMS: coluna de quantidade, unidade, filtros e agregados (veja wms.py)")
+    parser.add_argument('--situacao-map', metavar='JSON',
+                        help="arquivo com os rótulos das situações do histórico por código, "
+                             "ex.: {\"8\": \"cancelado\"} (completa o mapa padrão)")
+    parser.add_argument('--wms-summary', action='store_true',
+                        help=f"salva também {WMS_SUMMARY_PARQUET} com os agregados do WMS por item")
+    parser.add_argument('--no-delta', action='store_true',
+                        help=f"não compara com a execução anterior ({DELTA_PARQUET} e {DELTA_EXCEL})")
+    parser.add_argument('--delta-min-estoque', type=float, default=DEFAULT_MIN_ESTOQUE,
+                        help="variação mínima de estoque_cd (em caixas) incluída no delta (padrão: qualquer variação)")
+    parser.add_argument('--watch', action='store_true',
+                        help="observa o diretório de entrada e processa cada planilha nova ou alterada "
+                             "(-j define quantas ao mesmo tempo; padrão: 1)")
+    parser.add_argument('--settle', type=float, default=10.0,
+                        help="no modo --watch, segundos sem alteração antes de processar um arquivo (padrão: 10)")
+    parser.add_argument('--poll', type=float, default=2.0,
+                        help="no modo --watch, intervalo entre verificações do diretório em segundos (padrão: 2)")
+    args = parser.parse_args(argv)
+    options = {'incremental': args.incremental, 'validate_ean': args.validate_ean,
+               'lojas_parquet': args.lojas_parquet, 'excel_writer': args.excel_writer,
+               'chunked': args.chunked, 'chunk_rows': args.chunk_rows, 'max_memory_mb': args.max_memory_mb,
+               'parquet_layout': args.parquet_layout, 'compression': args.compression,
+               'row_group_size': args.row_group_size, 'historico_store': args.historico_store,
+               'profile': args.profile, 'sheet_cache': not args.no_sheet_cache,
+               'sheet_cache_mb': args.sheet_cache_mb, 'wms_layout': args.wms_layout,
+               'situacao_map': args.situacao_map,
+               'wms_summary': args.wms_summary, 'delta': not args.no_delta,
+               'delta_min_estoque': args.delta_min_estoque, 'startup': startup_info(ready_s=ready_s)}
+
+    if args.clear_sheet_cache:
+        freed = SheetCache().clear()
+        print(f"✓ Cache de planilhas apagado ({freed / 1024 / 1024:.0f} MB liberados)")
+
+    if args.watch:
+        if not os.path.isdir(args.input):
+            parser.error("--watch requer um diretório de entrada")
+        # Imported here: watcher builds on this module
+        from watcher import Watcher
+        Watcher(args.input, args.output, args.workers or 1, args.settle, args.poll, **options).run()
+        return 0
+
+    if os.path.isdir(args.input):
+        results = process_directory(args.input, args.output, args.workers, **options)
+        return 1 if any(isinstance(r, Exception) for r in results.values()) else 0
+
+    try:
+        process_workbook(args.input, args.output, **options)
+    except Exception as e:
+        print(f"✗ ERRO NO PROCESSAMENTO: {e}")
+        return 1
+    print("✓ PROCESSAMENTO CONCLUÍDO COM SUCESSO!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
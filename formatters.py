@@ -0,0 +1,242 @@
+"""Column formatters used by the engine, written to run over whole columns."""
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Order status code -> label. Codes not listed here (and values that are not
+# integers) are kept as they are.
+SITUACAO_MAP = {
+    1: "aguardando",
+    2: "processando",
+    3: "processando",
+    4: "processando",
+    5: "processando",
+    6: "enviado",
+    7: "em falta",
+}
+
+EAN_WIDTH = 13
+LOJA_WIDTH = 3
+
+_POW10 = np.array([10 ** i for i in range(20)], dtype='uint64')
+
+# int() accepts surrounding whitespace, a sign and '_' digit separators
+_INT_PATTERN = r'^\s*[+-]?\d+(?:_\d+)*\s*$'
+
+
+def load_situacao_map(mapping=None):
+    """SITUACAO_MAP updated with mapping (a dict or the path of a JSON file).
+
+    JSON object keys are text, so every key must be an integer code written
+    as text or as a number: {"8": "cancelado", "7": "sem estoque"}.
+    """
+    if isinstance(mapping, str):
+        with open(mapping, encoding='utf-8') as f:
+            mapping = json.load(f)
+    mapping = mapping or {}
+    if not isinstance(mapping, dict):
+        raise ValueError("O mapa de situações deve ser um objeto JSON (código -> rótulo)")
+    result = dict(SITUACAO_MAP)
+    for code, label in mapping.items():
+        try:
+            code = int(code)
+        except (TypeError, ValueError):
+            raise ValueError(f"Código de situação inválido: '{code}' (use números inteiros)") from None
+        if not isinstance(label, str):
+            raise ValueError(f"Rótulo inválido para a situação {code}: {label!r}")
+        result[code] = label
+    return result
+
+
+def map_situacao(x):
+    """Scalar reference implementation, kept for checking map_situacao_series."""
+    try:
+        val = int(x)
+        if val == 1: return "aguardando"
+        if 2 <= val <= 5: return "processando"
+        if val == 6: return "enviado"
+        if val == 7: return "em falta"
+        return x
+    except:
+        return x
+
+
+def _int_or_nan(x):
+    try:
+        return int(x)
+    except:
+        return np.nan
+
+
+def _int_codes(series):
+    """Float array with int(x) for every value, NaN wherever int(x) raises.
+
+    Only codes that can hit the mapping matter, so values outside the float
+    range may safely come out as NaN: they are passed through either way.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+    else:
+        kind = pd.api.types.infer_dtype(series, skipna=True)
+        if kind in ('integer', 'floating', 'mixed-integer-float', 'boolean', 'empty'):
+            values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        elif kind == 'string':
+            text = series.astype(object)
+            is_int = text.str.match(_INT_PATTERN).fillna(False).to_numpy(dtype=bool)
+            values = np.full(len(series), np.nan)
+            values[is_int] = pd.to_numeric(text[is_int].str.replace('_', ''), errors='coerce').to_numpy(dtype='float64')
+            # Non-ASCII digits match \d and int() accepts them; to_numeric doesn't
+            missed = is_int & np.isnan(values)
+            values[missed] = [_int_or_nan(x) for x in text[missed]]
+        else:
+            values = np.array([_int_or_nan(x) for x in series], dtype='float64')
+    with np.errstate(invalid='ignore'):
+        codes = np.trunc(values)
+    codes[~np.isfinite(codes)] = np.nan
+    return codes
+
+
+def map_situacao_series(series, mapping=None):
+    """Vectorized map_situacao returning a Categorical Series.
+
+    Values are coerced with int() semantics (floats truncated, integer strings
+    parsed) and looked up in `mapping` (defaults to SITUACAO_MAP). Unmapped
+    and non-numeric values are passed through unchanged, as map_situacao does.
+    """
+    mapping = SITUACAO_MAP if mapping is None else mapping
+    keys = pd.Index(list(mapping), dtype='float64')
+    labels = np.array(list(mapping.values()), dtype=object)
+    categories = pd.unique(labels)
+
+    pos = keys.get_indexer(_int_codes(series))
+    mapped = pos >= 0
+    label_codes = pd.Index(categories).get_indexer(labels)
+
+    codes = np.full(len(series), -1, dtype='int64')
+    codes[mapped] = label_codes[pos[mapped]]
+    if not mapped.all():
+        # Unmapped values become extra categories after the labels; factorizing
+        # only that subset keeps the common all-mapped case cheap.
+        extra_codes, extra = pd.factorize(series[~mapped])
+        extra = np.asarray(extra, dtype=object)
+        categories = pd.unique(np.concatenate([categories, extra]))
+        # Trailing -1 so missing values (factorize code -1) stay missing
+        extra_pos = np.append(pd.Index(categories).get_indexer(extra), -1)
+        codes[~mapped] = extra_pos[extra_codes]
+
+    result = pd.Categorical.from_codes(codes, categories=categories)
+    return pd.Series(result, index=series.index, name=series.name)
+
+
+def _pad_int64(ints, width, missing=None):
+    """Zero-pad an int64 array to `width` digits straight into an Arrow string array.
+
+    Same output as str(v).zfill(width): never truncates longer numbers and
+    keeps the sign in front ('-05'). Digits are produced column by column on
+    the whole array, then the wanted suffix of each row is cut out with a mask,
+    so no Python string is created per row.
+    """
+    n = len(ints)
+    neg = ints < 0
+    absv = np.abs(ints).astype('uint64')
+    ndigits = np.maximum(np.searchsorted(_POW10, absv, side='right'), 1)
+    lengths = np.maximum(width, ndigits + neg)
+    if missing is not None:
+        lengths[missing] = 0
+    digit_len = lengths - neg
+    w = int(digit_len.max()) if n else width
+
+    chars = np.empty((n, w + 1), dtype='uint8')
+    chars[:, 0] = ord('-')
+    for j in range(w):
+        chars[:, j + 1] = (absv // _POW10[w - 1 - j]) % 10 + ord('0')
+    keep = np.empty((n, w + 1), dtype=bool)
+    keep[:, 0] = neg
+    keep[:, 1:] = np.arange(w) >= (w - digit_len)[:, None]
+    if missing is not None:
+        keep[missing, 0] = False
+
+    offsets = np.zeros(n + 1, dtype='int32')
+    np.cumsum(lengths, out=offsets[1:])
+    validity = None
+    if missing is not None and missing.any():
+        validity = pa.py_buffer(np.packbits(~missing, bitorder='little'))
+    return pa.StringArray.from_buffers(n, pa.py_buffer(offsets), pa.py_buffer(chars[keep]), validity)
+
+
+def pad_codes(series, width, as_category=False, fill=0):
+    """Vectorized pd.to_numeric(s, errors='coerce').fillna(fill).astype(int).astype(str).str.zfill(width).
+
+    Returns Arrow-backed strings, or a Categorical when as_category=True,
+    which suits low-cardinality codes like 'loja': only the distinct values
+    are padded. fill=None leaves unparseable values missing instead of
+    turning them into zeros.
+    """
+    nums = pd.to_numeric(series, errors='coerce')
+    missing = nums.isna().to_numpy()
+    ints = nums.fillna(0 if fill is None else fill).astype('int64').to_numpy()
+    if fill is not None:
+        missing = None
+
+    if as_category:
+        present = np.ones(len(ints), dtype=bool) if missing is None else ~missing
+        codes = np.full(len(ints), -1, dtype='int64')
+        codes[present], uniques = pd.factorize(ints[present], sort=True)
+        labels = _pad_int64(np.asarray(uniques, dtype='int64'), width).to_pandas()
+        result = pd.Categorical.from_codes(codes, categories=labels.astype(object))
+    else:
+        result = _pad_int64(ints, width, missing).to_pandas().array
+    return pd.Series(result, index=series.index, name=series.name)
+
+
+def join_by_key(keys, values, sep='-'):
+    """Join the string values of each key with `sep`, keeping their original order.
+
+    Vectorized equivalent of groupby(keys)[values].apply(sep.join): the keys
+    are factorized in sorted order (numbers and text mixed in one column sort
+    as groupby does), one stable sort of the integer codes brings each key's
+    values together, the group boundaries become the offsets of an Arrow
+    list array and binary_join concatenates every list in one call. Returns
+    (unique sorted keys, Arrow list array, Arrow joined strings); rows with a
+    missing key are dropped, as groupby does.
+    """
+    codes, uniques = pd.factorize(keys.to_numpy(), sort=True)
+    present = codes >= 0
+    order = np.flatnonzero(present)[np.argsort(codes[present], kind='stable')]
+    sorted_codes = codes[order]
+
+    if len(order):
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    else:
+        starts = np.array([], dtype='int64')
+    offsets = np.append(starts, len(order)).astype('int32')
+
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Take from the (few) category strings instead of materializing every row
+        categories = pa.array(values.cat.categories.astype(str), type=pa.string())
+        taken = categories.take(pa.array(values.cat.codes.to_numpy()[order]))
+    else:
+        taken = pa.array(values.astype(str).to_numpy()[order], type=pa.string())
+    lists = pa.ListArray.from_arrays(pa.array(offsets), taken)
+    return np.asarray(uniques), lists, pc.binary_join(lists, sep)
+
+
+def ean_check_valid(series):
+    """True where the value is a positive integer with a correct GTIN check digit.
+
+    Works for EAN-8/UPC/EAN-13/GTIN-14 alike: from the right, the check digit
+    is followed by alternating weights 3 and 1. Non-numeric values and 0 are
+    invalid.
+    """
+    nums = pd.to_numeric(series, errors='coerce')
+    ints = nums.fillna(0).astype('int64').to_numpy()
+    valid = (ints > 0) & nums.notna().to_numpy() & (nums.fillna(0).to_numpy() == ints)
+    absv = np.abs(ints).astype('uint64')
+    total = np.zeros(len(ints), dtype='uint64')
+    for pos in range(1, 19):
+        total += (absv // _POW10[pos]) % 10 * (3 if pos % 2 else 1)
+    valid &= (10 - total % 10) % 10 == absv % 10
+    return pd.Series(valid, index=series.index, name=series.name)
@@ -1,19 +1,47 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
+from tkinter import filedialog, messagebox, scrolledtext, ttk
+import queue
 import threading
-import pandas as pd
 import os
 import sys
+import time
+
+# Só módulos leves aqui: pandas, pyarrow e openpyxl (via engine) são
+# importados em segundo plano depois que a janela aparece
+from profiling import launch_time, startup_info
+from progress import Cancelled, Progress
+
+# Intervalo (ms) entre duas leituras da fila de mensagens do processamento
+INTERVALO_FILA = 100
+
+NOMES_ETAPAS = {
+    'load': "Carregando planilhas",
+    'format_mix': "Formatando mix",
+    'format_historico': "Processando histórico",
+    'consolidate_lojas': "Consolidando lojas",
+    'estoque_cd': "Calculando estoque CD",
+    'delta': "Comparando com a execução anterior",
+    'write': "Salvando arquivos",
+}
 
 
 class UnificadorGUI:
-    def __init__(self, root):
+    def __init__(self, root, inicio=None):
         self.root = root
         self.root.title("Unificador de Dados")
-        self.root.geometry("700x500")
+        self.root.geometry("700x580")
         self.root.resizable(False, False)
         
         self.arquivo_selecionado = None
+        # A thread de processamento não mexe no Tk: ela coloca mensagens,
+        # progresso e ações nesta fila, que o loop principal esvazia
+        self.fila = queue.Queue()
+        self.cancelar = threading.Event()
+        # Marcado quando o engine e suas bibliotecas terminam de carregar
+        self.bibliotecas = threading.Event()
+        self.erro_bibliotecas = None
+        self.inicio = inicio or launch_time()
+        self.tempos_inicio = {}
         
         # Frame principal
         main_frame = tk.Frame(root, padx=20, pady=20)
@@ -42,13 +70,35 @@ class UnificadorGUI:
                                     cursor="hand2", padx=10)
         self.btn_browse.pack(side=tk.RIGHT)
         
+        self.btn_limpar_cache = tk.Button(input_frame, text="Limpar Cache",
+                                          command=self.limpar_cache,
+                                          font=("Arial", 10), cursor="hand2", padx=10,
+                                          state=tk.DISABLED)
+        self.btn_limpar_cache.pack(side=tk.RIGHT, padx=(0, 10))
+        
         # Botão processar
         self.btn_processar = tk.Button(main_frame, text="PROCESSAR DADOS", 
                                        command=self.processar_dados,
                                        font=("Arial", 12, "bold"), bg="#2196F3", 
                                        fg="white", cursor="hand2", pady=10,
                                        state=tk.DISABLED)
-        self.btn_processar.pack(fill=tk.X, pady=(0, 20))
+        self.btn_processar.pack(fill=tk.X, pady=(0, 10))
+        
+        # Barra de progresso e botão cancelar
+        progress_frame = tk.Frame(main_frame)
+        progress_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.btn_cancelar = tk.Button(progress_frame, text="CANCELAR",
+                                      command=self.cancelar_processamento,
+                                      font=("Arial", 10), bg="#F44336", fg="white",
+                                      cursor="hand2", padx=10, state=tk.DISABLED)
+        self.btn_cancelar.pack(side=tk.RIGHT, padx=(10, 0))
+        
+        self.progress_bar = ttk.Progressbar(progress_frame, mode='determinate', maximum=100)
+        self.progress_bar.pack(side=tk.TOP, fill=tk.X, expand=True)
+        
+        self.progress_label = tk.Label(progress_frame, text="", font=("Arial", 9), anchor=tk.W)
+        self.progress_label.pack(side=tk.TOP, fill=tk.X)
         
         # Área de log
         tk.Label(main_frame, text="Log de Processamento:", 
@@ -59,13 +109,96 @@ class UnificadorGUI:
                                                    state='disabled', wrap=tk.WORD)
         self.log_text.pack(fill=tk.BOTH, expand=True, pady=(5, 0))
         
+        self.root.after(INTERVALO_FILA, self.processar_fila)
+        # Roda assim que o loop principal desenha a janela
+        self.root.after_idle(self.janela_pronta)
+        
+    def janela_pronta(self):
+        """Anota o tempo até a janela aparecer e começa a carregar as bibliotecas"""
+        self.root.update_idletasks()
+        self.tempos_inicio['window_s'] = time.time() - self.inicio
+        thread = threading.Thread(target=self.carregar_bibliotecas)
+        thread.daemon = True
+        thread.start()
+    
+    def carregar_bibliotecas(self):
+        """Importa o engine (pandas, pyarrow, openpyxl) fora da thread do Tk"""
+        try:
+            import openpyxl  # noqa: F401
+            import engine  # noqa: F401
+            import sheet_cache  # noqa: F401
+        except Exception as e:
+            self.erro_bibliotecas = e
+            self.log(f"✗ Erro ao carregar as bibliotecas: {e}")
+        else:
+            self.tempos_inicio['libraries_s'] = time.time() - self.inicio
+            self.na_thread_principal(lambda: self.btn_limpar_cache.config(state=tk.NORMAL))
+        finally:
+            self.bibliotecas.set()
+    
     def log(self, mensagem):
-        """Adiciona mensagem ao log"""
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, mensagem + "\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state='disabled')
-        self.root.update()
+        """Adiciona mensagem ao log (pode ser chamado de qualquer thread)"""
+        self.fila.put(('log', mensagem))
+    
+    def progresso(self, evento):
+        """Recebe o progresso do engine na thread de processamento"""
+        self.fila.put(('progresso', evento))
+    
+    def na_thread_principal(self, acao):
+        """Agenda uma ação que mexe no Tk para o loop principal"""
+        self.fila.put(('acao', acao))
+    
+    def processar_fila(self):
+        """Esvazia a fila: insere as mensagens de uma vez e mostra só o último progresso"""
+        linhas = []
+        ultimo_progresso = None
+        acoes = []
+        try:
+            while True:
+                tipo, valor = self.fila.get_nowait()
+                if tipo == 'log':
+                    linhas.append(valor)
+                elif tipo == 'progresso':
+                    ultimo_progresso = valor
+                else:
+                    acoes.append(valor)
+        except queue.Empty:
+            pass
+        
+        if linhas:
+            self.log_text.config(state='normal')
+            self.log_text.insert(tk.END, "\n".join(linhas) + "\n")
+            self.log_text.see(tk.END)
+            self.log_text.config(state='disabled')
+        if ultimo_progresso:
+            self.mostrar_progresso(ultimo_progresso)
+        for acao in acoes:
+            acao()
+        self.root.after(INTERVALO_FILA, self.processar_fila)
+    
+    def mostrar_progresso(self, evento):
+        """Atualiza a barra com a porcentagem e as linhas/s da etapa atual"""
+        etapa = NOMES_ETAPAS.get(evento['stage'], evento['stage'])
+        texto = etapa
+        if evento['percent'] is None:
+            if self.progress_bar['mode'] != 'indeterminate':
+                self.progress_bar.config(mode='indeterminate')
+                self.progress_bar.start(20)
+        else:
+            if self.progress_bar['mode'] != 'determinate':
+                self.progress_bar.stop()
+                self.progress_bar.config(mode='determinate')
+            self.progress_bar['value'] = evento['percent']
+            texto += f" - {evento['percent']:.0f}%"
+        if evento['rows']:
+            texto += f" - {evento['rows']:,} linhas ({evento['rate']:,.0f} linhas/s)".replace(',', '.')
+        self.progress_label.config(text=texto)
+    
+    def limpar_progresso(self, texto=""):
+        self.progress_bar.stop()
+        self.progress_bar.config(mode='determinate')
+        self.progress_bar['value'] = 0
+        self.progress_label.config(text=texto)
     
     def selecionar_arquivo(self):
         """Abre diálogo para selecionar arquivo Excel"""
@@ -82,6 +215,16 @@ class UnificadorGUI:
             self.btn_processar.config(state=tk.NORMAL)
             self.log(f"✓ Arquivo selecionado: {os.path.basename(arquivo)}")
     
+    def limpar_cache(self):
+        """Apaga as planilhas guardadas no cache por execuções anteriores"""
+        if not messagebox.askyesno("Limpar Cache",
+                                   "Apagar o cache de planilhas?\n\n"
+                                   "A próxima execução vai ler as planilhas do Excel de novo."):
+            return
+        from sheet_cache import SheetCache
+        liberado = SheetCache().clear()
+        self.log(f"✓ Cache de planilhas apagado ({liberado / 1024 / 1024:.0f} MB liberados)")
+    
     def processar_dados(self):
         """Executa o processamento em uma thread separada"""
         if not self.arquivo_selecionado:
@@ -91,6 +234,10 @@ class UnificadorGUI:
         # Desabilita botões durante processamento
         self.btn_processar.config(state=tk.DISABLED)
         self.btn_browse.config(state=tk.DISABLED)
+        self.btn_limpar_cache.config(state=tk.DISABLED)
+        self.btn_cancelar.config(state=tk.NORMAL)
+        self.cancelar.clear()
+        self.limpar_progresso()
         
         # Limpa log
         self.log_text.config(state='normal')
@@ -102,12 +249,17 @@ class UnificadorGUI:
         thread.daemon = True
         thread.start()
     
+    def cancelar_processamento(self):
+        """Pede para a thread de processamento parar no próximo bloco"""
+        self.cancelar.set()
+        self.btn_cancelar.config(state=tk.DISABLED)
+        self.log("⏳ Cancelando...")
+    
     def executar_processamento(self):
-        """Lógica de processamento (baseada em ap.py)"""
+        """Executa o pipeline do engine e reporta o progresso no log"""
         try:
             input_file = self.arquivo_selecionado
             output_dir = os.path.dirname(input_file)
-            output_file = os.path.join(output_dir, 'unificador_processado.xlsx')
             
             self.log("="*60)
             self.log("INICIANDO PROCESSAMENTO")
@@ -116,157 +268,60 @@ class UnificadorGUI:
             self.log(f"Diretório de saída: {output_dir}")
             self.log("")
             
-            # Carregar dados
-            self.log("⏳ Carregando planilhas...")
-            df_mix = pd.read_excel(input_file, sheet_name='mix')
-            self.log(f"  ✓ 'mix' carregada ({len(df_mix)} linhas)")
-            
-            df_ativo = pd.read_excel(input_file, sheet_name='item_ativo')
-            self.log(f"  ✓ 'item_ativo' carregada ({len(df_ativo)} linhas)")
-            
-            df_wms = pd.read_excel(input_file, sheet_name='wms')
-            self.log(f"  ✓ 'wms' carregada ({len(df_wms)} linhas)")
-            
-            try:
-                df_historico = pd.read_excel(input_file, sheet_name='historico')
-                self.log(f"  ✓ 'historico' carregada ({len(df_historico)} linhas)")
-            except ValueError:
-                self.log("  ⚠ Planilha 'historico' não encontrada")
-                df_historico = pd.DataFrame()
-            
-            self.log("")
-            
-            # Formatar codigo_ean
-            self.log("⏳ Formatando 'codigo_ean'...")
-            if 'codigo_ean' in df_mix.columns:
-                df_mix['codigo_ean'] = pd.to_numeric(df_mix['codigo_ean'], errors='coerce').fillna(0).astype(int).astype(str).str.zfill(13)
-                self.log("  ✓ Códigos EAN formatados para 13 dígitos")
-            else:
-                self.log("  ⚠ Coluna 'codigo_ean' não encontrada")
-            
-            # Formatar historico
-            if not df_historico.empty:
-                if 'loja' in df_historico.columns:
-                    self.log("⏳ Formatando 'loja' no histórico...")
-                    df_historico['loja'] = pd.to_numeric(df_historico['loja'], errors='coerce').fillna(0).astype(int).astype(str).str.zfill(3)
-                    self.log("  ✓ Lojas formatadas para 3 dígitos")
-                
-                if 'data_pedido' in df_historico.columns:
-                    self.log("⏳ Formatando 'data_pedido' no histórico...")
-                    df_historico['data_pedido'] = pd.to_datetime(df_historico['data_pedido'], errors='coerce').dt.strftime('%d/%m/%y')
-                    self.log("  ✓ Datas formatadas (DD/MM/AA)")
-                
-                if 'situacao' in df_historico.columns:
-                    self.log("⏳ Mapeando 'situacao' no histórico...")
-                    def map_situacao(x):
-                        try:
-                            val = int(x)
-                            if val == 1: return "aguardando"
-                            if 2 <= val <= 5: return "processando"
-                            if val == 6: return "enviado"
-                            if val == 7: return "em falta"
-                            return x
-                        except:
-                            return x
-                    df_historico['situacao'] = df_historico['situacao'].apply(map_situacao)
-                    self.log("  ✓ Situações mapeadas")
-            
-            self.log("")
-            
-            # Processar loja_ativa_mix
-            self.log("⏳ Processando 'loja_ativa_mix'...")
-            active_items = df_ativo[df_ativo['status'] == 'A'].copy()
-            active_items['loja'] = pd.to_numeric(active_items['loja'], errors='coerce').fillna(0).astype(int).astype(str).str.zfill(3)
-            lojas_ativas = active_items.groupby('codigo_interno')['loja'].apply(lambda x: '-'.join(x)).reset_index()
-            lojas_ativas.rename(columns={'loja': 'loja_ativa_mix_calculated'}, inplace=True)
-            df_mix = pd.merge(df_mix, lojas_ativas, on='codigo_interno', how='left')
-            df_mix['loja_ativa_mix'] = df_mix['loja_ativa_mix_calculated']
-            df_mix.drop(columns=['loja_ativa_mix_calculated'], inplace=True)
-            self.log("  ✓ Lojas ativas consolidadas")
-            
-            self.log("")
-            
-            # Processar estoque_cd
-            self.log("⏳ Processando 'estoque_cd'...")
-            qty_col = None
-            possible_qty_cols = ['qtde', 'quantidade', 'saldo', 'estoque', 'total']
-            for col in df_wms.columns:
-                if col.lower() in possible_qty_cols:
-                    qty_col = col
-                    break
+            if not self.bibliotecas.is_set():
+                self.log("  … Aguardando o carregamento das bibliotecas")
+                self.bibliotecas.wait()
+            if self.erro_bibliotecas:
+                raise self.erro_bibliotecas
+            from engine import process_workbook
             
-            if qty_col:
-                self.log(f"  ✓ Coluna de quantidade encontrada: '{qty_col}'")
-                wms_sum = df_wms.groupby('codigo_interno')[qty_col].sum().reset_index()
-                wms_sum.rename(columns={qty_col: 'total_estoque'}, inplace=True)
-                
-                if 'total_estoque' in df_mix.columns:
-                    df_mix.drop(columns=['total_estoque'], inplace=True)
-                
-                df_mix = pd.merge(df_mix, wms_sum, on='codigo_interno', how='left')
-                df_mix['total_estoque'] = pd.to_numeric(df_mix['total_estoque'], errors='coerce').fillna(0)
-                df_mix['embalagem'] = pd.to_numeric(df_mix['embalagem'], errors='coerce').fillna(1)
-                df_mix['estoque_cd'] = df_mix['total_estoque'] / df_mix['embalagem']
-                self.log("  ✓ Estoque CD calculado (em caixas)")
-            else:
-                self.log("  ⚠ Coluna de quantidade não identificada no WMS")
-            
-            self.log("")
-            
-            # Salvar Excel
-            self.log("⏳ Salvando arquivo Excel...")
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                df_mix.to_excel(writer, sheet_name='mix', index=False)
-                if not df_historico.empty:
-                    df_historico.to_excel(writer, sheet_name='historico', index=False)
-            self.log(f"  ✓ Salvo: {os.path.basename(output_file)}")
-            
-            self.log("")
+            progress = Progress(self.progresso, self.cancelar)
+            output_file = process_workbook(input_file, output_dir, log=self.log, progress=progress,
+                                           startup=startup_info(**self.tempos_inicio))
             
-            # Salvar Parquet
-            self.log("⏳ Salvando arquivos Parquet...")
-            try:
-                mix_parquet = os.path.join(output_dir, 'mix.parquet')
-                df_mix.to_parquet(mix_parquet, index=False)
-                self.log(f"  ✓ Salvo: mix.parquet")
-                
-                if not df_historico.empty:
-                    hist_parquet = os.path.join(output_dir, 'historico.parquet')
-                    df_historico.to_parquet(hist_parquet, index=False)
-                    self.log(f"  ✓ Salvo: historico.parquet")
-            except Exception as e:
-                self.log(f"  ⚠ Erro ao salvar Parquet: {e}")
-            
-            self.log("")
             self.log("="*60)
             self.log("✓ PROCESSAMENTO CONCLUÍDO COM SUCESSO!")
             self.log("="*60)
+            self.na_thread_principal(lambda: self.limpar_progresso("Concluído"))
             
             # Mostrar mensagem de sucesso
-            self.root.after(0, lambda: messagebox.showinfo(
+            self.na_thread_principal(lambda: messagebox.showinfo(
                 "Sucesso", 
                 f"Processamento concluído!\n\nArquivo salvo em:\n{output_file}"
             ))
+        
+        except Cancelled:
+            self.log("")
+            self.log("="*60)
+            self.log("✗ PROCESSAMENTO CANCELADO")
+            self.log("="*60)
+            self.na_thread_principal(lambda: self.limpar_progresso("Cancelado"))
             
         except Exception as e:
+            erro = str(e)
             self.log("")
             self.log("="*60)
-            self.log(f"✗ ERRO NO PROCESSAMENTO: {str(e)}")
+            self.log(f"✗ ERRO NO PROCESSAMENTO: {erro}")
             self.log("="*60)
-            self.root.after(0, lambda: messagebox.showerror(
+            self.na_thread_principal(lambda: self.limpar_progresso("Erro"))
+            self.na_thread_principal(lambda: messagebox.showerror(
                 "Erro", 
-                f"Erro durante o processamento:\n\n{str(e)}"
+                f"Erro durante o processamento:\n\n{erro}"
             ))
         
         finally:
             # Reabilita botões
-            self.root.after(0, lambda: self.btn_processar.config(state=tk.NORMAL))
-            self.root.after(0, lambda: self.btn_browse.config(state=tk.NORMAL))
+            self.na_thread_principal(lambda: self.btn_processar.config(state=tk.NORMAL))
+            self.na_thread_principal(lambda: self.btn_browse.config(state=tk.NORMAL))
+            self.na_thread_principal(lambda: self.btn_limpar_cache.config(state=tk.NORMAL))
+            self.na_thread_principal(lambda: self.btn_cancelar.config(state=tk.DISABLED))
 
 
 def main():
+    # Antes de criar a janela: no executável de um arquivo, o início é o do bootloader
+    inicio = launch_time()
     root = tk.Tk()
-    app = UnificadorGUI(root)
+    app = UnificadorGUI(root, inicio)
     root.mainloop()
 
 
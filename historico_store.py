@@ -0,0 +1,363 @@
+"""Append-only historico store with deduplicated incremental ingestion.
+
+historico.parquet only ever holds what the current workbook contains. The
+store keeps every order seen so far in historico_store/part-NNNNNN.parquet
+files. Each part carries two extra columns: _key_hash (hash of the order
+identity, HISTORICO_KEY, plus its occurrence number) and _row_hash (hash of
+the whole row). On ingest only those two columns are read from the existing
+parts; incoming rows whose key is new, or whose row hash differs from the
+latest stored version, are appended as one new part. Unchanged rows cost
+nothing, so a run's write cost follows the delta rather than the total
+history.
+
+Runs don't all produce the same types: the dataset layout keeps data_pedido
+as a date where the file layout writes dd/mm/yy text, chunked mode skips
+the compact types of schema.py, and float32 is only used when lossless. So
+before hashing, every batch is converted to one fixed set of types (see
+store_table): data_pedido as a date, loja as zero-padded text, codes as
+int64, other numbers as float64, the rest as text. Every part is written
+with that schema, and the same orders hash the same in every mode.
+
+The key isn't unique in practice: the same item, store and date can appear
+on more than one line. Repeated keys are numbered in order of appearance
+(0, 1, ...) and the number is part of the key hash, so each line is kept.
+
+Readers take the latest version of each key (highest part number, last row
+within a part). Once there are more than COMPACT_AFTER_PARTS parts they are
+compacted into a single part holding only the latest versions.
+"""
+import glob
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from formatters import LOJA_WIDTH
+
+HISTORICO_STORE = 'historico_store'
+
+# Order identity: one line per item, store and order date
+HISTORICO_KEY = ('codigo_interno', 'loja', 'data_pedido')
+
+COMPACT_AFTER_PARTS = 20
+
+# Parts written with the fixed types of store_table; older stores are converted on ingest
+STORE_FORMAT = b'2'
+FORMAT_KEY = b'unificador_store_format'
+
+# Fixed store types of the known columns; other columns are float64 if numeric, text otherwise
+CODE_COLUMNS = ('codigo_interno',)
+DATE_COLUMN = 'data_pedido'
+DISPLAY_DATE = '%d/%m/%y'
+TEXT_COLUMNS = ('loja', 'situacao')
+
+# Stands for a missing integer or date when hashing
+_MISSING = np.iinfo('int64').min
+
+_PART_RE = re.compile(r'part-(\d+)\.parquet$')
+_HASH_COLS = ['_key_hash', '_row_hash']
+
+
+def _parts(root):
+    """Existing part files, oldest first."""
+    parts = []
+    for path in glob.glob(os.path.join(root, 'part-*.parquet')):
+        match = _PART_RE.search(path)
+        if match:
+            parts.append((int(match.group(1)), path))
+    return [path for _, path in sorted(parts)]
+
+
+def _part_path(root, seq):
+    return os.path.join(root, f'part-{seq:06d}.parquet')
+
+
+def _next_seq(parts):
+    return int(_PART_RE.search(parts[-1]).group(1)) + 1 if parts else 1
+
+
+def _is_current(path):
+    metadata = pq.read_schema(path).metadata or {}
+    return metadata.get(FORMAT_KEY) == STORE_FORMAT
+
+
+def _store_column(name, column):
+    """column (an Arrow chunked array) converted to its fixed store type."""
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    if pa.types.is_null(column.type):
+        column = column.cast(pa.string())
+
+    if name == DATE_COLUMN:
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            column = pc.strptime(column, format=DISPLAY_DATE, unit='s', error_is_null=True)
+        # Drops the time of day, as the dd/mm/yy text does
+        return column.cast(pa.date32(), safe=False)
+    if name in CODE_COLUMNS:
+        if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+            return column.cast(pa.int64())
+        # Codes kept as read because some aren't numbers: those are left blank
+        codes = pd.to_numeric(column.to_pandas(), errors='coerce').astype('Int64')
+        return pa.chunked_array([pa.array(codes, type=pa.int64())])
+    if name == 'loja':
+        if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+            column = column.cast(pa.int64()).cast(pa.string())
+        return pc.utf8_lpad(column.cast(pa.string()), LOJA_WIDTH, '0')
+    if name not in TEXT_COLUMNS and (pa.types.is_integer(column.type) or pa.types.is_floating(column.type)
+                                     or pa.types.is_boolean(column.type)):
+        return column.cast(pa.float64())
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        return column.cast(pa.string())
+    values = column.to_pandas()
+    return pa.chunked_array([pa.array(values.astype(str).where(values.notna()), type=pa.string())])
+
+
+def store_table(df, schema=None):
+    """df (a formatted historico batch, or an Arrow table) as an Arrow table with the fixed store types.
+
+    schema is the schema of the existing parts: the table then follows its
+    columns, with columns it lacks left blank.
+    """
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df, preserve_index=False)
+    columns = {name: _store_column(name, table[name]) for name in table.column_names}
+    if schema is None:
+        fields = [pa.field(name, column.type) for name, column in columns.items()]
+        schema = pa.schema(fields, metadata={FORMAT_KEY: STORE_FORMAT})
+    else:
+        extra = set(columns) - set(schema.names)
+        if extra:
+            raise ValueError(f"Colunas que não existem no histórico acumulado: {', '.join(sorted(extra))}")
+        schema = pa.schema([f for f in schema if f.name not in _HASH_COLS], metadata=schema.metadata)
+    arrays = []
+    for field in schema:
+        column = columns.get(field.name)
+        if column is None:
+            column = pa.nulls(table.num_rows, field.type)
+        try:
+            arrays.append(column.cast(field.type))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            raise ValueError(f"Coluna '{field.name}' com tipo {column.type} no histórico, "
+                             f"mas {field.type} no histórico acumulado") from None
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _hashable(column):
+    """A numpy array of column whose hash depends only on the values, never on the batch."""
+    if pa.types.is_date(column.type):
+        column = column.cast(pa.int32())
+    if pa.types.is_integer(column.type):
+        # A null would turn the whole array into floats
+        return pc.fill_null(column.cast(pa.int64()), _MISSING).to_numpy()
+    return column.to_numpy()
+
+
+def _hash(table, names, occurrence=None):
+    frame = pd.DataFrame({name: _hashable(table[name]) for name in names})
+    if occurrence is not None:
+        frame['_occurrence'] = occurrence
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+class _Occurrences:
+    """Numbers repeated keys in order of appearance, across the batches of one ingest."""
+
+    def __init__(self):
+        self.seen = pd.Series([], dtype='int64')
+
+    def number(self, key_hash):
+        keys = pd.Series(key_hash)
+        occurrence = keys.groupby(keys).cumcount().to_numpy()
+        if len(self.seen):
+            occurrence = occurrence + self.seen.reindex(key_hash, fill_value=0).to_numpy()
+        self.seen = self.seen.add(keys.value_counts(), fill_value=0).astype('int64')
+        return occurrence
+
+
+def _hashes(table, key, occurrences):
+    key_hash = _hash(table, key, occurrences.number(_hash(table, key)))
+    row_hash = _hash(table, table.column_names)
+    return key_hash, row_hash
+
+
+def _latest_hashes(parts):
+    """Row hash of the latest stored version of every key, indexed by key hash."""
+    if not parts:
+        return pd.Series([], dtype='uint64')
+    stored = pd.concat([pd.read_parquet(p, columns=_HASH_COLS) for p in parts], ignore_index=True)
+    stored = stored.drop_duplicates('_key_hash', keep='last')
+    return pd.Series(stored['_row_hash'].to_numpy(), index=stored['_key_hash'].to_numpy())
+
+
+def _source_frames(source):
+    """The incoming historico as DataFrames: a DataFrame or a Parquet file path."""
+    if isinstance(source, pd.DataFrame):
+        yield source
+    else:
+        for batch in pq.ParquetFile(source).iter_batches():
+            yield batch.to_pandas()
+
+
+def _append(root, frames, parts, key, compare=True):
+    """Write the new or changed rows of frames as the part after parts.
+
+    compare=False writes every row, ignoring what parts hold (and their
+    schema). Returns (counts, number of repeated keys, path of the new part
+    or None).
+    """
+    latest = _latest_hashes(parts if compare else [])
+    schema = pq.read_schema(parts[-1]) if parts and compare else None
+    path = _part_path(root, _next_seq(parts))
+    tmp_path = path + '.tmp'
+    occurrences = _Occurrences()
+
+    counts = {'novas': 0, 'alteradas': 0, 'inalteradas': 0}
+    repeated = 0
+    writer = None
+    try:
+        for df in frames:
+            names = df.column_names if isinstance(df, pa.Table) else list(df.columns)
+            missing = [c for c in key if c not in names]
+            if missing:
+                raise ValueError(f"Colunas da chave do histórico ausentes: {', '.join(missing)}")
+            table = store_table(df, schema)
+            schema = table.schema
+            key_hash, row_hash = _hashes(table, key, occurrences)
+            pos = latest.index.get_indexer(key_hash)
+            is_new = pos < 0
+            stored = latest.to_numpy()[np.where(is_new, 0, pos)] if len(latest) else row_hash
+            changed = ~is_new & (stored != row_hash)
+
+            counts['novas'] += int(is_new.sum())
+            counts['alteradas'] += int(changed.sum())
+            counts['inalteradas'] += int((~is_new & ~changed).sum())
+
+            delta = is_new | changed
+            if not delta.any():
+                continue
+            out = table.filter(pa.array(delta))
+            out = out.append_column('_key_hash', pa.array(key_hash[delta])) \
+                .append_column('_row_hash', pa.array(row_hash[delta]))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, out.schema)
+            writer.write_table(out)
+        repeated = int((occurrences.seen > 1).sum())
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            os.remove(tmp_path)
+        raise
+
+    if writer is None:
+        return counts, repeated, None
+    writer.close()
+    os.replace(tmp_path, path)
+    return counts, repeated, path
+
+
+def _convert(root, parts, key, log=print):
+    """Rewrite a store written before the fixed store types as one current part; returns the parts.
+
+    Old parts may each have their own types (the same orders could be stored
+    twice, with text and with real dates), so each is converted on its own.
+    The old format kept one row per key, and so does the conversion: the
+    last version of each key once the types agree.
+    """
+    log("  ⚠ Histórico acumulado em formato antigo, convertendo...")
+    schema = None
+    tables = []
+    for part in parts:
+        table = store_table(pq.read_table(part).drop_columns(_HASH_COLS), schema)
+        schema = table.schema
+        tables.append(table)
+    table = pa.concat_tables(tables)
+    latest = ~pd.Series(_hash(table, key)).duplicated(keep='last').to_numpy()
+
+    # Numbered after the old parts, so it is the latest even if the removal below is interrupted
+    _append(root, [table.filter(pa.array(latest))], parts, key, compare=False)
+    for part in parts:
+        os.remove(part)
+    return _parts(root)
+
+
+def ingest(root, source, key=HISTORICO_KEY, log=print):
+    """Append new or changed historico rows to the store at root.
+
+    source is the formatted historico (DataFrame, or a Parquet file path in
+    chunked mode). Returns a dict with the number of 'novas', 'alteradas' and
+    'inalteradas' rows.
+    """
+    os.makedirs(root, exist_ok=True)
+    parts = _parts(root)
+    if parts and not _is_current(parts[-1]):
+        parts = _convert(root, parts, key, log)
+
+    counts, repeated, path = _append(root, _source_frames(source), parts, key)
+    if path:
+        parts.append(path)
+    if repeated:
+        log(f"  ⚠ {repeated} pedidos repetidos (mesmos {', '.join(key)}); cada linha é guardada")
+    log(f"  ✓ Histórico acumulado: {counts['novas']} novas, {counts['alteradas']} alteradas, "
+        f"{counts['inalteradas']} inalteradas")
+    if len(parts) > COMPACT_AFTER_PARTS:
+        compact(root, log)
+    return counts
+
+
+def compact(root, log=print):
+    """Rewrite all parts as one part holding only the latest version of each key.
+
+    Parts are read one at a time. The compacted part gets the next sequence
+    number before the old ones are removed, so readers stay correct even if
+    compaction is interrupted.
+    """
+    parts = _parts(root)
+    if len(parts) < 2:
+        return
+    # Position of the latest version of every key across all parts
+    hashes = [pd.read_parquet(p, columns=['_key_hash'])['_key_hash'].to_numpy() for p in parts]
+    all_keys = np.concatenate(hashes)
+    keep = ~pd.Series(all_keys).duplicated(keep='last').to_numpy()
+
+    path = _part_path(root, _next_seq(parts))
+    tmp_path = path + '.tmp'
+    writer = None
+    rows = 0
+    offset = 0
+    for part, part_keys in zip(parts, hashes):
+        mask = keep[offset:offset + len(part_keys)]
+        offset += len(part_keys)
+        if not mask.any():
+            continue
+        table = pq.read_table(part).filter(pa.array(mask))
+        if writer is None:
+            # Every part has the store schema, so the first one's fits them all
+            writer = pq.ParquetWriter(tmp_path, table.schema)
+        writer.write_table(table)
+        rows += table.num_rows
+    if writer is not None:
+        writer.close()
+        os.replace(tmp_path, path)
+    for part in parts:
+        os.remove(part)
+    log(f"  ✓ Histórico acumulado compactado: {len(parts)} arquivos -> 1 ({rows} linhas)")
+
+
+def _read_parts(parts, columns=None):
+    """The latest version of each key in parts, without the hash columns."""
+    read_cols = None if columns is None else list(columns) + ['_key_hash']
+    df = pd.concat([pq.read_table(p, columns=read_cols).to_pandas(date_as_object=False) for p in parts],
+                   ignore_index=True)
+    df = df.drop_duplicates('_key_hash', keep='last')
+    return df.drop(columns=[c for c in _HASH_COLS if c in df.columns]).reset_index(drop=True)
+
+
+def read_store(root, columns=None):
+    """The stored historico with one row (the latest version) per order line."""
+    parts = _parts(root)
+    if not parts:
+        return pd.DataFrame(columns=columns)
+    return _read_parts(parts, columns)
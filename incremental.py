@@ -0,0 +1,149 @@
+"""Incremental re-processing: skip stages whose input sheet did not change.
+
+A cache folder next to the outputs holds a manifest.json plus one Parquet
+snapshot per derived table (lojas_ativas, wms_summary, formatted historico).
+The manifest records, for each stage, the content hash of the sheet it was
+computed from and the hash of the table it produced. When the input hash of
+a stage matches the manifest, the snapshot is read back instead of running
+the stage again.
+
+The input hash is the sheet's key from loader.sheet_keys (its raw XML in
+the workbook zip) when there is one, so it is known before the sheet is
+parsed: a sheet whose only stage is fresh (see StageCache.fresh) need not
+be read at all. Without a key the parsed sheet itself is hashed.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CACHE_DIR = '.unificador_cache'
+MANIFEST = 'manifest.json'
+
+# Bump whenever a cached stage changes its output, so old snapshots are ignored
+CACHE_VERSION = 7
+
+
+def frame_hash(df):
+    """Content hash of a DataFrame: column names, dtypes and every value."""
+    h = hashlib.sha256()
+    h.update(repr([str(c) for c in df.columns]).encode())
+    h.update(repr([str(t) for t in df.dtypes]).encode())
+    for _, col in df.items():
+        # List columns (e.g. lojas_ativas 'lojas') aren't hashable element-wise
+        if isinstance(col.dtype, pd.ArrowDtype) and pa.types.is_nested(col.dtype.pyarrow_dtype):
+            col = col.astype(str)
+        h.update(pd.util.hash_pandas_object(col, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _nested_as_arrow(arrow_type):
+    return pd.ArrowDtype(arrow_type) if pa.types.is_nested(arrow_type) else None
+
+
+def read_snapshot(path):
+    """Read a snapshot back, keeping list columns Arrow-backed.
+
+    pandas can't rebuild ArrowDtype list columns from its own Parquet
+    metadata, so the metadata is ignored; dictionary columns still come back
+    as categoricals.
+    """
+    return pq.read_table(path).to_pandas(ignore_metadata=True, types_mapper=_nested_as_arrow)
+
+
+class NoCache:
+    """Stand-in used when incremental mode is off: always computes."""
+
+    def fresh(self, name, key, params=None):
+        return False
+
+    def run(self, name, source, compute, params=None, key=None):
+        return compute(source)
+
+    def save(self):
+        pass
+
+
+class StageCache:
+    def __init__(self, output_dir, log=print):
+        self.cache_dir = os.path.join(output_dir, CACHE_DIR)
+        self.manifest_path = os.path.join(self.cache_dir, MANIFEST)
+        self.log = log
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {'version': CACHE_VERSION, 'stages': {}}
+        if manifest.get('version') != CACHE_VERSION:
+            return {'version': CACHE_VERSION, 'stages': {}}
+        return manifest
+
+    def _input_hash(self, input_hash, params):
+        if params is not None:
+            input_hash = hashlib.sha256((input_hash + json.dumps(params, sort_keys=True)).encode()).hexdigest()
+        return input_hash
+
+    def _snapshot(self, name):
+        return os.path.join(self.cache_dir, f'{name}.parquet')
+
+    def fresh(self, name, key, params=None):
+        """True if stage name has a snapshot computed from the sheet with this key and params."""
+        entry = self.manifest['stages'].get(name)
+        return (key is not None and entry is not None and entry['input_hash'] == self._input_hash(key, params)
+                and os.path.exists(self._snapshot(name)))
+
+    def run(self, name, source, compute, params=None, key=None):
+        """Return compute(source), reusing the snapshot if source is unchanged.
+
+        params (JSON-serializable) are the settings compute depends on; a
+        change in them invalidates the snapshot like a change in source.
+        key is the sheet_keys entry of the sheet source was read from; when
+        given it replaces hashing source, which may then be None if fresh()
+        said the snapshot can be reused.
+        """
+        if key is None and (source is None or source.empty):
+            return compute(source)
+
+        input_hash = self._input_hash(frame_hash(source) if key is None else key, params)
+        entry = self.manifest['stages'].get(name)
+        snapshot = self._snapshot(name)
+        if entry and entry['input_hash'] == input_hash and os.path.exists(snapshot):
+            try:
+                result = read_snapshot(snapshot)
+                self.log(f"  ↺ '{name}' sem alterações, reaproveitado do cache")
+                return result
+            except Exception as e:
+                if source is None:
+                    raise
+                self.log(f"  ⚠ Cache de '{name}' ilegível, recalculando: {e}")
+
+        result = compute(source)
+        if result is None:
+            return result
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            result.to_parquet(snapshot, index=False)
+        except Exception as e:
+            self.log(f"  ⚠ Não foi possível salvar o cache de '{name}': {e}")
+            self.manifest['stages'].pop(name, None)
+            return result
+        self.manifest['stages'][name] = {
+            'input_hash': input_hash,
+            'output_hash': frame_hash(result),
+            'rows': len(result),
+        }
+        return result
+
+    def save(self):
+        """Write the manifest atomically so an interrupted run can't corrupt it."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
@@ -0,0 +1,53 @@
+"""Aligned lookups on codigo_interno without merging mix.
+
+mix gets several derived columns (loja_ativa_mix, total_estoque) from
+tables keyed by codigo_interno. pd.merge rebuilds the whole of mix for each
+of them. KeyIndex factorizes the mix keys once into a sorted unique index
+plus the position of every mix row in it; each derived column is then a
+lookup of the unique keys in the other table, broadcast back to the rows
+with a single take, and assigned to mix in place.
+"""
+import numpy as np
+import pandas as pd
+
+
+class KeyIndex:
+    """Sorted unique keys of a column, with the position of each row's key among them."""
+
+    def __init__(self, keys):
+        index = pd.Index(keys)
+        if index.is_monotonic_increasing and index.is_unique:
+            # Already sorted and unique (mix is usually ordered by code): no hashing needed
+            codes, uniques = np.arange(len(index)), index
+        else:
+            codes, uniques = pd.factorize(index, sort=True)
+        self.codes = codes
+        self.keys = pd.Index(uniques)
+        self.has_blanks = bool((codes < 0).any())
+        # Rows per key; blank keys (code -1) are not counted
+        self.counts = np.bincount(codes[codes >= 0] if self.has_blanks else codes, minlength=len(uniques))
+
+    @property
+    def n_duplicates(self):
+        """Rows whose key already appeared on an earlier row."""
+        return int(len(self.codes) - self.has_blanks * (self.codes < 0).sum() - len(self.keys))
+
+    def duplicate_keys(self, limit=5):
+        """A few of the keys that appear more than once."""
+        return self.keys[self.counts > 1][:limit].tolist()
+
+    def lookup(self, keys, values):
+        """values, reordered to line up with the indexed rows; missing keys give NA.
+
+        keys must be unique (e.g. the result of a groupby). Returns an array
+        of the same type as values, one element per indexed row.
+        """
+        keys = pd.Index(keys)
+        if not keys.is_unique:
+            raise ValueError("Chaves repetidas na tabela de consulta")
+        per_key = keys.get_indexer(self.keys)
+        rows = per_key[self.codes]
+        if self.has_blanks:
+            rows[self.codes < 0] = -1
+        values = pd.Series(values).array
+        return values.take(rows, allow_fill=True)
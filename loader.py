@@ -0,0 +1,207 @@
+import hashlib
+import posixpath
+import re
+import time
+import zipfile
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+from progress import NoProgress
+
+# Sheets read by the pipeline, in load order. 'historico' may be missing from
+# older workbooks; the others are required.
+SHEETS = ('mix', 'item_ativo', 'wms', 'historico')
+OPTIONAL_SHEETS = ('historico',)
+
+SHARED_STRINGS = 'xl/sharedStrings.xml'
+STYLES = 'xl/styles.xml'
+
+# Shared string index of a t="s" cell, style index of a cell (or row), and one
+# <si> entry of sharedStrings.xml (empty when self-closing)
+_STRING_INDEX_RE = re.compile(rb't="s"[^>]*>\s*<(?:\w+:)?v>(\d+)')
+_STYLE_INDEX_RE = re.compile(rb' s="(\d+)"')
+_SHARED_STRING_RE = re.compile(rb'<(?:\w+:)?si>(.*?)</(?:\w+:)?si>|<(?:\w+:)?si\s*/>', re.S)
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+def default_engine():
+    """Prefer the calamine (Rust) reader when installed, openpyxl otherwise."""
+    try:
+        import python_calamine  # noqa: F401
+        return 'calamine'
+    except ImportError:
+        return 'openpyxl'
+
+
+def _sheet_parts(archive):
+    """Sheet name -> path of its worksheet XML inside the xlsx/xlsm zip."""
+    targets = {}
+    for rel in ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels')).iter(_REL_NS + 'Relationship'):
+        target = rel.get('Target', '')
+        # Targets are relative to xl/ unless absolute within the package
+        targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    return {sheet.get('name'): targets.get(sheet.get(_REL_ID))
+            for sheet in workbook.iter(_MAIN_NS + 'sheet')}
+
+
+def _shared_string_hashes(archive, names):
+    """64-bit hash of every sharedStrings.xml entry, by index."""
+    if SHARED_STRINGS not in names:
+        return np.zeros(0, dtype='uint64')
+    entries = _SHARED_STRING_RE.findall(archive.read(SHARED_STRINGS))
+    return pd.util.hash_array(np.array([e.decode('utf-8') for e in entries], dtype=object))
+
+
+def _style_hashes(archive, names):
+    """64-bit hash of the number format of every cell style (cellXfs entry), by index.
+
+    Only the number format changes the values read (dates vs numbers), so
+    fonts, fills and borders are left out.
+    """
+    if STYLES not in names:
+        return np.zeros(0, dtype='uint64')
+    styles = ElementTree.fromstring(archive.read(STYLES))
+    codes = {fmt.get('numFmtId'): fmt.get('formatCode') for fmt in styles.iter(_MAIN_NS + 'numFmt')}
+    cell_xfs = styles.find(_MAIN_NS + 'cellXfs')
+    formats = [] if cell_xfs is None else [f"{xf.get('numFmtId', '0')}|{codes.get(xf.get('numFmtId'), '')}"
+                                           for xf in cell_xfs.iter(_MAIN_NS + 'xf')]
+    return pd.util.hash_array(np.array(formats, dtype=object))
+
+
+def _hash_references(h, xml, pattern, hashes):
+    """Hash the indices pattern finds in xml as the hashes they refer to; returns xml without them.
+
+    The matches are cut out of xml and a NUL left in their place, so the
+    rest of the sheet still hashes the same whatever the indices are.
+    """
+    # split() alternates text and captured index: text, index, text, ..., text
+    pieces = pattern.split(xml)
+    indices = np.array(pieces[1::2]).astype(np.int64)
+    h.update(hashes[indices].tobytes())
+    return b'\0'.join(pieces[0::2])
+
+
+def sheet_keys(input_file, sheets=SHEETS):
+    """Content key of each of sheets found in the workbook, without parsing any cell.
+
+    A key hashes the sheet's raw worksheet XML inside the xlsx zip, with
+    each shared string index replaced by the text it refers to and each
+    style index by its number format. Text or formats added for another
+    sheet (or shared strings renumbered when Excel saves) leave the key
+    unchanged; only an edit to the sheet itself changes it. Sheets missing
+    from the workbook get no key, and a file that isn't a readable xlsx zip
+    gets none at all.
+    """
+    try:
+        with zipfile.ZipFile(input_file) as archive:
+            parts = _sheet_parts(archive)
+            names = set(archive.namelist())
+            strings = styles = None
+            keys = {}
+            for sheet in sheets:
+                if parts.get(sheet) not in names:
+                    continue
+                if strings is None:
+                    strings, styles = _shared_string_hashes(archive, names), _style_hashes(archive, names)
+                h = hashlib.sha256(sheet.encode('utf-8'))
+                xml = _hash_references(h, archive.read(parts[sheet]), _STRING_INDEX_RE, strings)
+                xml = _hash_references(h, xml, _STYLE_INDEX_RE, styles)
+                h.update(xml)
+                keys[sheet] = h.hexdigest()
+            return keys
+    except (OSError, KeyError, IndexError, zipfile.BadZipFile, ElementTree.ParseError):
+        return {}
+
+
+def load_sheets(input_file, sheets=SHEETS, usecols=None, dtype=None, engine=None, log=print, progress=None):
+    """Open the workbook once and read every requested sheet from that handle.
+
+    pd.read_excel(path, sheet_name=...) reopens and re-parses the zip for every
+    call; an ExcelFile keeps the archive and shared strings loaded, and the
+    openpyxl engine opens it with read_only=True so rows are streamed.
+
+    usecols and dtype are optional dicts keyed by sheet name, passed through to
+    the reader for that sheet. Returns (frames, timings), where timings maps
+    each sheet name to its load time in seconds. progress (see progress.py)
+    is advanced after each sheet.
+    """
+    progress = progress or NoProgress()
+    usecols = usecols or {}
+    dtype = dtype or {}
+    engine = engine or default_engine()
+
+    frames = {}
+    timings = {}
+    start = time.perf_counter()
+    with pd.ExcelFile(input_file, engine=engine) as xl:
+        timings['_open'] = time.perf_counter() - start
+        for i, sheet in enumerate(sheets):
+            if sheet not in xl.sheet_names:
+                if sheet in OPTIONAL_SHEETS:
+                    log(f"  ⚠ Planilha '{sheet}' não encontrada")
+                    frames[sheet] = pd.DataFrame()
+                    continue
+                raise ValueError(f"Worksheet named '{sheet}' not found")
+
+            t0 = time.perf_counter()
+            frames[sheet] = xl.parse(sheet, usecols=usecols.get(sheet), dtype=dtype.get(sheet))
+            timings[sheet] = time.perf_counter() - t0
+            log(f"  ✓ '{sheet}' carregada ({len(frames[sheet])} linhas, {timings[sheet]:.2f}s)")
+            progress.advance(len(frames[sheet]), fraction=(i + 1) / len(sheets))
+
+    return frames, timings
+
+
+def _parse_rows(header, batch):
+    # Same value conversions and dtype inference as read_excel, which also
+    # turns numbers stored as text ('0020152') into numbers
+    from pandas.io.parsers import TextParser
+
+    rows = [[int(v) if isinstance(v, float) and v.is_integer() else v for v in row] for row in batch]
+    return TextParser([list(header)] + rows, header=0).read()
+
+
+def iter_sheet_chunks(input_file, sheet, chunk_rows):
+    """Stream a sheet as DataFrames of at most chunk_rows rows.
+
+    Uses an openpyxl read-only workbook so only the current batch of rows is
+    held in memory, and parses each batch the way read_excel would.
+    chunk_rows may also be a callable returning the size of the next batch,
+    which lets the caller adapt it to a memory budget. Fully empty rows are
+    skipped, as read_excel does with trailing blank rows. Yields nothing if
+    the sheet doesn't exist.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(input_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        if sheet not in wb.sheetnames:
+            return
+        rows = wb[sheet].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        width = len(header)
+
+        batch = []
+        size = chunk_rows() if callable(chunk_rows) else chunk_rows
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            if len(row) != width:
+                row = (row + (None,) * width)[:width]
+            batch.append(row)
+            if len(batch) >= size:
+                yield _parse_rows(header, batch)
+                batch = []
+                size = chunk_rows() if callable(chunk_rows) else chunk_rows
+        if batch:
+            yield _parse_rows(header, batch)
+    finally:
+        wb.close()
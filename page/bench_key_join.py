@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from engine import build_lojas_ativas, consolidate_lojas, compute_estoque_cd, format_mix, index_mix
+from profiling import RssSampler, current_rss
+from schema import apply_schemas
+from synth_workbook import make_frames
+from wms import resolve_layout, summarize_wms
+
+
+def quiet(msg):
+    pass
+
+
+class Precomputed:
+    """Stage cache stand-in that returns lojas_ativas and wms_summary computed
+    beforehand, so only attaching the columns to mix is measured."""
+
+    def __init__(self, frames):
+        self.results = {'lojas_ativas': build_lojas_ativas(frames['item_ativo']),
+                        'wms_summary': summarize_wms(frames['wms'], resolve_layout(frames['wms'], log=quiet), ['sum'])}
+
+    def run(self, name, source, compute, params=None):
+        return self.results[name]
+
+
+def merge_stages(df_mix, frames, cache):
+    """The two pd.merge calls the engine used before the KeyIndex lookups."""
+    lojas_ativas = cache.results['lojas_ativas']
+    df_mix = pd.merge(df_mix, lojas_ativas[['codigo_interno', 'loja_ativa_mix_calculated']], on='codigo_interno',
+                      how='left')
+    df_mix['loja_ativa_mix'] = df_mix['loja_ativa_mix_calculated']
+    df_mix.drop(columns=['loja_ativa_mix_calculated'], inplace=True)
+
+    df_mix.drop(columns=['total_estoque'], inplace=True)
+    df_mix = pd.merge(df_mix, cache.results['wms_summary'], on='codigo_interno', how='left')
+    df_mix['total_estoque'] = pd.to_numeric(df_mix['total_estoque'], errors='coerce').fillna(0)
+    df_mix['embalagem'] = pd.to_numeric(df_mix['embalagem'], errors='coerce').fillna(1)
+    df_mix['estoque_cd'] = df_mix['total_estoque'] / df_mix['embalagem']
+    return df_mix
+
+
+def indexed_stages(df_mix, frames, cache):
+    # As in process_workbook: one index for both lookups
+    index = index_mix(df_mix, quiet)
+    df_mix = consolidate_lojas(df_mix, frames['item_ativo'], quiet, cache, index=index)
+    return compute_estoque_cd(df_mix, frames['wms'], quiet, cache, index)
+
+
+VARIANTS = {'merge': merge_stages, 'index': indexed_stages}
+
+
+def make_inputs(mix_rows, lojas, wms_rows, sort_mix):
+    frames = make_frames(mix_rows=mix_rows, lojas=lojas, wms_rows=wms_rows, historico_rows=1)
+    if not sort_mix:
+        # Real mix sheets are not ordered by codigo_interno
+        frames['mix'] = frames['mix'].sample(frac=1, random_state=0).reset_index(drop=True)
+    frames, _ = apply_schemas(frames, quiet)
+    return frames
+
+
+def measure(variant, frames, repeat):
+    """Best wall time of a variant, and its peak RSS growth over one run (MB)."""
+    fn = VARIANTS[variant]
+    cache = Precomputed(frames)
+    df_mix = format_mix(frames['mix'].copy(), quiet)
+    before = current_rss()
+    with RssSampler(interval=0.001) as sampler:
+        result = fn(df_mix, frames, cache)
+    peak = (sampler.peak - before) / 1024 / 1024
+
+    best = None
+    for _ in range(repeat):
+        df_mix = format_mix(frames['mix'].copy(), quiet)
+        start = time.perf_counter()
+        fn(df_mix, frames, cache)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, peak, result
+
+
+def bench(mix_rows, lojas, wms_rows, repeat, sort_mix):
+    print(f"mix {mix_rows:,} rows ({'sorted' if sort_mix else 'unsorted'}), item_ativo {mix_rows * lojas:,} rows, "
+          f"wms {wms_rows:,} rows")
+    results = {}
+    for variant in VARIANTS:
+        # Each variant in a fresh process, so memory freed by one doesn't hide the other's growth
+        cmd = [sys.executable, os.path.abspath(__file__), '--variant', variant, '--mix-rows', str(mix_rows),
+               '--lojas', str(lojas), '--wms-rows', str(wms_rows), '--repeat', str(repeat)]
+        if sort_mix:
+            cmd.append('--sorted')
+        results[variant] = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout)
+    for variant, label in (('merge', 'pd.merge x2'), ('index', 'KeyIndex lookup')):
+        r = results[variant]
+        print(f"{label + ':':<17}{r['time']:.3f}s, peak RSS +{r['peak_mb']:.0f} MB")
+    merge, index = results['merge'], results['index']
+    assert merge['hash'] == index['hash'], "outputs differ"
+    print(f"Outputs match. Time {index['time'] / merge['time']:.2f}x, "
+          f"peak memory {index['peak_mb'] / merge['peak_mb']:.2f}x of the merges")
+
+
+def run_variant(variant, mix_rows, lojas, wms_rows, repeat, sort_mix):
+    from incremental import frame_hash
+
+    frames = make_inputs(mix_rows, lojas, wms_rows, sort_mix)
+    best, peak, result = measure(variant, frames, repeat)
+    result = result.astype({'embalagem': 'float64'})
+    print(json.dumps({'time': best, 'peak_mb': peak, 'hash': frame_hash(result)}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the mix merges with KeyIndex lookups.")
+    parser.add_argument('--mix-rows', type=int, default=1_000_000)
+    parser.add_argument('--lojas', type=int, default=2)
+    parser.add_argument('--wms-rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sorted', action='store_true', help="keep mix ordered by codigo_interno")
+    parser.add_argument('--variant', choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.variant:
+        run_variant(args.variant, args.mix_rows, args.lojas, args.wms_rows, args.repeat, args.sorted)
+    else:
+        bench(args.mix_rows, args.lojas, args.wms_rows, args.repeat, args.sorted)
@@ -0,0 +1,237 @@
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, ROOT)
+from engine import HISTORICO_PARQUET, MIX_PARQUET, OUTPUT_EXCEL, compute_estoque_cd, consolidate_lojas, \
+    format_historico, format_mix, write_outputs
+from formatters import SITUACAO_MAP
+from profiling import RUN_REPORT, RunReport
+from schema import apply_schemas
+from synth_workbook import fits_excel, generate_workbook, make_frames, parse_scale, scale_sizes
+
+RESULTS = os.path.join(HERE, 'bench_results.jsonl')
+DEFAULT_SCALES = '10k,100k'
+
+# Slowdown against the previous commit that gets flagged in the comparison
+REGRESSION = 0.20
+
+
+def quiet(msg):
+    pass
+
+
+# --- Output checks (these used to be the printed samples of verify_ap.py) ---
+
+def _excel_row_counts(output_file):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(output_file, read_only=True)
+    try:
+        return {ws.title: ws.max_row - 1 for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def check_outputs(output_dir):
+    """Assert the processed Excel and Parquet files in output_dir are well formed.
+
+    Returns the mix and historico frames read from Parquet (historico is
+    None when the workbook had none).
+    """
+    output_file = os.path.join(output_dir, OUTPUT_EXCEL)
+    assert os.path.exists(output_file), f"missing {output_file}"
+    mix_parquet = os.path.join(output_dir, MIX_PARQUET)
+    assert os.path.exists(mix_parquet), f"missing {mix_parquet}"
+    df_mix = pd.read_parquet(mix_parquet)
+    hist_parquet = os.path.join(output_dir, HISTORICO_PARQUET)
+    df_hist = pd.read_parquet(hist_parquet) if os.path.exists(hist_parquet) else None
+
+    sheet_rows = _excel_row_counts(output_file)
+    assert sheet_rows.get('mix') == len(df_mix), f"mix: {sheet_rows.get('mix')} rows in Excel, {len(df_mix)} in Parquet"
+    if df_hist is not None:
+        assert sheet_rows.get('historico') == len(df_hist), \
+            f"historico: {sheet_rows.get('historico')} rows in Excel, {len(df_hist)} in Parquet"
+
+    for col in ('codigo_ean', 'loja_ativa_mix', 'estoque_cd'):
+        assert col in df_mix.columns, f"mix: column '{col}' missing"
+    ean = df_mix['codigo_ean'].dropna().astype(str)
+    bad = ean[~ean.str.fullmatch(r'\d{13,14}')]
+    assert bad.empty, f"mix: {len(bad)} EANs are not 13 (or 14) digits, e.g. {bad.iloc[0]!r}"
+    lojas = df_mix['loja_ativa_mix'].dropna().astype(str)
+    bad = lojas[~lojas.str.fullmatch(r'\d{3}(-\d{3})*')]
+    assert bad.empty, f"mix: malformed loja_ativa_mix, e.g. {bad.iloc[0]!r}"
+    assert pd.api.types.is_numeric_dtype(df_mix['estoque_cd']), "mix: estoque_cd is not numeric"
+
+    if df_hist is not None:
+        if 'loja' in df_hist.columns:
+            loja = df_hist['loja'].dropna().astype(str)
+            bad = loja[~loja.str.fullmatch(r'\d{3}')]
+            assert bad.empty, f"historico: loja not 3 digits, e.g. {bad.iloc[0]!r}"
+        if 'data_pedido' in df_hist.columns:
+            dates = df_hist['data_pedido'].dropna().astype(str)
+            bad = dates[~dates.str.fullmatch(r'\d{2}/\d{2}/\d{2}')]
+            assert bad.empty, f"historico: data_pedido not DD/MM/AA, e.g. {bad.iloc[0]!r}"
+        if 'situacao' in df_hist.columns:
+            codes = {str(code) for code in SITUACAO_MAP} | {f'{code}.0' for code in SITUACAO_MAP}
+            unmapped = df_hist['situacao'].dropna().astype(str).isin(codes)
+            assert not unmapped.any(), f"historico: {unmapped.sum()} situacao codes were not mapped"
+    return df_mix, df_hist
+
+
+def check_against_source(df_mix, frames):
+    """Assert loja_ativa_mix and estoque_cd match a plain recomputation from the source sheets."""
+    ativo = frames['item_ativo']
+    ativo = ativo[ativo['status'] == 'A']
+    expected = ativo.groupby('codigo_interno', sort=False)['loja'].apply(
+        lambda x: '-'.join(x.astype(str).str.zfill(3)))
+    got = df_mix.set_index('codigo_interno')['loja_ativa_mix']
+    mismatch = got.reindex(expected.index) != expected
+    assert not mismatch.any(), f"loja_ativa_mix differs for {mismatch.sum()} items"
+
+    wms_sum = frames['wms'].groupby('codigo_interno')['estoque'].sum()
+    mix = frames['mix'].set_index('codigo_interno')
+    expected = wms_sum.reindex(mix.index).fillna(0) / pd.to_numeric(mix['embalagem']).fillna(1)
+    got = df_mix.set_index('codigo_interno')['estoque_cd'].reindex(expected.index)
+    assert np.allclose(got.to_numpy(dtype=float), expected.to_numpy(dtype=float)), "estoque_cd differs"
+
+
+# --- Benchmarks ---
+
+def bench_stages(sizes):
+    """Time each stage on in-memory synthetic sheets; the write stage only if they fit in Excel."""
+    frames = make_frames(**sizes)
+    report = RunReport()
+    with report.stage('schema', sum(len(df) for df in frames.values())) as stage:
+        frames, _ = apply_schemas(frames, quiet)
+        stage['rows_out'] = sum(len(df) for df in frames.values())
+    with report.stage('format_mix', len(frames['mix'])) as stage:
+        df_mix = format_mix(frames['mix'].copy(), quiet)
+        stage['rows_out'] = len(df_mix)
+    with report.stage('format_historico', len(frames['historico'])) as stage:
+        df_hist = format_historico(frames['historico'].copy(), quiet)
+        stage['rows_out'] = len(df_hist)
+    with report.stage('consolidate_lojas', len(df_mix) + len(frames['item_ativo'])) as stage:
+        df_mix = consolidate_lojas(df_mix, frames['item_ativo'], quiet)
+        stage['rows_out'] = len(df_mix)
+    with report.stage('estoque_cd', len(df_mix) + len(frames['wms'])) as stage:
+        df_mix = compute_estoque_cd(df_mix, frames['wms'], quiet)
+        stage['rows_out'] = len(df_mix)
+    check_against_source(df_mix, frames)
+
+    if fits_excel(sizes):
+        with tempfile.TemporaryDirectory() as tmp:
+            with report.stage('write', len(df_mix) + len(df_hist)) as stage:
+                write_outputs(df_mix, df_hist, tmp, quiet)
+                stage['rows_out'] = len(df_mix) + len(df_hist)
+            check_outputs(tmp)
+    else:
+        print("  (write skipped: sheets exceed the Excel row limit)")
+    return report.stages
+
+
+def bench_end_to_end(sizes, extra_args=()):
+    """Generate a workbook, run engine.py on it in a fresh process and return its run report."""
+    with tempfile.TemporaryDirectory() as tmp:
+        workbook = os.path.join(tmp, 'unificador.xlsm')
+        start = time.perf_counter()
+        generate_workbook(workbook, **sizes)
+        print(f"  workbook generated in {time.perf_counter() - start:.1f}s")
+        out = os.path.join(tmp, 'out')
+        # Without the sheet cache: a throwaway workbook would only fill it, and the parse is what we measure
+        subprocess.run([sys.executable, os.path.join(ROOT, 'engine.py'), workbook, '-o', out, '--no-sheet-cache',
+                        *extra_args],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(os.path.join(out, RUN_REPORT), encoding='utf-8') as f:
+            report = json.load(f)
+        df_mix, _ = check_outputs(out)
+        check_against_source(df_mix, make_frames(**sizes))
+    report['stages'].append({'stage': 'total', 'wall_s': report['wall_s'], 'cpu_s': report['cpu_s'],
+                             'peak_rss_mb': report['peak_rss_mb']})
+    return report['stages']
+
+
+def git_revision():
+    """Short commit hash of the tree under test, with '-dirty' if it has uncommitted changes."""
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'diff', '--quiet', 'HEAD'], cwd=ROOT).returncode != 0
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return rev + '-dirty' if dirty else rev
+
+
+def record(results_path, commit, scale, mode, stages):
+    date = datetime.datetime.now().isoformat(timespec='seconds')
+    with open(results_path, 'a', encoding='utf-8') as f:
+        for s in stages:
+            entry = {'commit': commit, 'date': date, 'scale': scale, 'mode': mode, 'stage': s['stage'],
+                     'wall_s': s['wall_s'], 'cpu_s': s['cpu_s'], 'peak_rss_mb': s.get('peak_rss_mb')}
+            f.write(json.dumps(entry) + '\n')
+
+
+def previous_results(results_path, commit):
+    """Latest recorded wall time per (scale, mode, stage) from any commit other than this one."""
+    previous = {}
+    if not os.path.exists(results_path):
+        return previous
+    with open(results_path, encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry['commit'] != commit:
+                previous[(entry['scale'], entry['mode'], entry['stage'])] = entry
+    return previous
+
+
+def print_table(scale, mode, stages, previous):
+    print(f"  {'stage':<20}{'wall':>9}{'cpu':>9}{'peak RSS':>10}   vs previous")
+    for s in stages:
+        rss = '-' if s.get('peak_rss_mb') is None else f"{s['peak_rss_mb']:.0f} MB"
+        line = f"  {s['stage']:<20}{s['wall_s']:>8.2f}s{s['cpu_s']:>8.2f}s{rss:>10}"
+        before = previous.get((scale, mode, s['stage']))
+        if before and before['wall_s'] > 0:
+            change = s['wall_s'] / before['wall_s'] - 1
+            flag = '  ⚠ slower' if change > REGRESSION and s['wall_s'] - before['wall_s'] > 0.05 else ''
+            line += f"   {change:+.0%} ({before['commit']}){flag}"
+        print(line)
+
+
+def run(scales, modes, results_path=RESULTS, save=True):
+    commit = git_revision()
+    previous = previous_results(results_path, commit)
+    for scale in scales:
+        sizes = scale_sizes(parse_scale(scale))
+        for mode in modes:
+            print(f"[{scale}] {mode}: {sizes}")
+            if mode == 'end_to_end' and not fits_excel(sizes):
+                print("  skipped: sheets exceed the Excel row limit, only in-memory stages run at this scale")
+                continue
+            stages = bench_stages(sizes) if mode == 'stages' else bench_end_to_end(sizes)
+            print_table(scale, mode, stages, previous)
+            if save:
+                record(results_path, commit, scale, mode, stages)
+    print(f"Outputs checked OK. Commit {commit}" + (f", results appended to {results_path}" if save else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the unificador pipeline on synthetic workbooks.")
+    parser.add_argument('--scales', default=DEFAULT_SCALES,
+                        help=f"comma-separated scales: 10k, 100k, 1m, 10m or row counts (default: {DEFAULT_SCALES})")
+    parser.add_argument('--mode', choices=('stages', 'end_to_end', 'all'), default='all',
+                        help="'stages' times each stage in memory, 'end_to_end' runs engine.py on a generated workbook")
+    parser.add_argument('--results', default=RESULTS, help="JSON lines file results are appended to and compared against")
+    parser.add_argument('--no-save', action='store_true', help="don't append this run to the results file")
+    args = parser.parse_args()
+    modes = ('stages', 'end_to_end') if args.mode == 'all' else (args.mode,)
+    run(args.scales.split(','), modes, args.results, not args.no_save)
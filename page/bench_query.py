@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from dataset import DEFAULT_ROW_GROUP_SIZE, HISTORICO_DATASET, write_historico_dataset
+from engine import HISTORICO_PARQUET, format_historico
+from query import scan
+from synth_workbook import iter_historico
+
+
+def quiet(msg):
+    pass
+
+
+def write_outputs(output_dir, rows, mix_rows, lojas):
+    """historico.parquet (text dates) and the historico/ dataset, as the engine writes them."""
+    path = os.path.join(output_dir, HISTORICO_PARQUET)
+    writer = None
+    typed = []
+    for chunk in iter_historico(mix_rows, lojas, rows):
+        typed.append(format_historico(chunk, quiet, display_dates=False))
+        table = pa.Table.from_pandas(format_historico(chunk.copy(), quiet), preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table, row_group_size=DEFAULT_ROW_GROUP_SIZE)
+    writer.close()
+    write_historico_dataset(pd.concat(typed, ignore_index=True), os.path.join(output_dir, HISTORICO_DATASET))
+
+
+def best_ms(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench(rows, mix_rows, lojas, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        file_dir, dataset_dir = os.path.join(tmp, 'arquivo'), os.path.join(tmp, 'dataset')
+        os.makedirs(file_dir)
+        os.makedirs(dataset_dir)
+        print(f"Writing {rows:,} historico rows...")
+        write_outputs(file_dir, rows, mix_rows, lojas)
+        os.replace(os.path.join(file_dir, HISTORICO_DATASET), os.path.join(dataset_dir, HISTORICO_DATASET))
+
+        item = int(pd.read_parquet(os.path.join(file_dir, HISTORICO_PARQUET), columns=['codigo_interno'])
+                   ['codigo_interno'].iloc[0])
+        queries = {
+            'item (all columns)': lambda d: scan(d, 'historico').where(codigo_interno=item),
+            'item (3 columns)': lambda d: scan(d, 'historico').select('loja', 'data_pedido', 'situacao')
+                .where(codigo_interno=item),
+            'store + em falta, last week': lambda d: scan(d, 'historico').select('codigo_interno', 'data_pedido')
+                .where(loja=3, situacao='em falta').between('2025-11-20', '2025-11-26'),
+        }
+        full, _ = best_ms(lambda: pd.read_parquet(os.path.join(file_dir, HISTORICO_PARQUET)), repeat)
+        print(f"{'full read of historico.parquet':<34}{full:>10.0f} ms")
+        for name, make in queries.items():
+            for layout, output_dir in (('file', file_dir), ('dataset', dataset_dir)):
+                ms, df = best_ms(lambda: make(output_dir).to_pandas(), repeat)
+                print(f"{name + ' [' + layout + ']':<34}{ms:>10.0f} ms  {len(df):>8,} rows")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of query.py lookups on a large historico.")
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    parser.add_argument('--mix-rows', type=int, default=20_000)
+    parser.add_argument('--lojas', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    bench(args.rows, args.mix_rows, args.lojas, args.repeat)
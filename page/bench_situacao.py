@@ -0,0 +1,41 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from formatters import map_situacao, map_situacao_series
+
+ROWS = 1_000_000
+
+
+def synthetic_situacao(rows, seed=0):
+    # Mostly codes 1..7, plus unmapped codes and blanks like in real exports
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, 10, size=rows).astype('float64')
+    values[rng.random(rows) < 0.01] = np.nan
+    return pd.Series(values, name='situacao')
+
+
+def bench():
+    series = synthetic_situacao(ROWS)
+    print(f"Synthetic historico: {ROWS} rows")
+
+    start = time.perf_counter()
+    expected = series.apply(map_situacao)
+    t_apply = time.perf_counter() - start
+    print(f"Series.apply(map_situacao): {t_apply:.3f}s")
+
+    start = time.perf_counter()
+    result = map_situacao_series(series)
+    t_vec = time.perf_counter() - start
+    print(f"map_situacao_series:        {t_vec:.3f}s")
+
+    assert result.astype(object).equals(expected.astype(object)), "outputs differ"
+    print(f"Outputs match. Speedup: {t_apply / t_vec:.1f}x")
+
+
+if __name__ == "__main__":
+    bench()
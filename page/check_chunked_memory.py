@@ -0,0 +1,47 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from synth_workbook import generate_workbook
+
+
+def peak_rss_mb(cmd):
+    """Run cmd and return the peak RSS of the child process, in MB (Linux/macOS)."""
+    import resource
+
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def check(rows, limit_mb, max_memory_mb, workbook=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        if not workbook:
+            workbook = os.path.join(tmp, 'unificador.xlsm')
+            print(f"Generating synthetic workbook with {rows} historico rows...")
+            start = time.perf_counter()
+            generate_workbook(workbook, mix_rows=2_000, lojas=10, wms_rows=2_000, historico_rows=rows)
+            print(f"  done in {time.perf_counter() - start:.0f}s")
+
+        cmd = [sys.executable, os.path.join(ROOT, 'engine.py'), workbook, '-o', os.path.join(tmp, 'out'),
+               '--chunked', '--max-memory-mb', str(max_memory_mb), '--no-sheet-cache']
+        start = time.perf_counter()
+        peak = peak_rss_mb(cmd)
+        print(f"Chunked run: {time.perf_counter() - start:.0f}s, peak RSS {peak:.0f} MB (limit {limit_mb} MB)")
+        assert peak < limit_mb, f"peak RSS {peak:.0f} MB exceeds {limit_mb} MB"
+        print("OK")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assert the chunked pipeline stays under a peak RSS limit.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--limit-mb', type=int, default=1024)
+    parser.add_argument('--max-memory-mb', type=int, default=256)
+    parser.add_argument('--workbook', help="use an existing workbook instead of generating one")
+    args = parser.parse_args()
+    check(args.rows, args.limit_mb, args.max_memory_mb, args.workbook)
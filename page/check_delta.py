@@ -0,0 +1,97 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from delta import ADDED, BOTH, DELTA_EXCEL, DELTA_PARQUET, ESTOQUE, LOJAS, REMOVED, compare_snapshots, write_delta
+
+STORES = np.array([f'{i:03d}' for i in range(1, 21)])
+
+
+def snapshot(items, rng):
+    """A mix snapshot of `items` items, each active in a few random stores."""
+    counts = rng.integers(0, 6, items)
+    offsets = np.r_[0, np.cumsum(counts)]
+    stores = STORES[rng.integers(0, len(STORES), offsets[-1])]
+    lojas = ['-'.join(stores[offsets[i]:offsets[i + 1]]) for i in range(items)]
+    return pd.DataFrame({
+        'codigo_interno': np.arange(1_000_000, 1_000_000 + items, dtype='int32'),
+        'descricao': [f'ITEM {i}' for i in range(items)],
+        'loja_ativa_mix': pd.Series(lojas).where(counts > 0),
+        'estoque_cd': rng.integers(0, 500, items).astype('float64'),
+    })
+
+
+def check_small():
+    previous = pd.DataFrame({'codigo_interno': [1, 2, 3, 4, 5], 'descricao': list('abcde'),
+                             'loja_ativa_mix': ['001-002', '003', None, '004-005', '001'],
+                             'estoque_cd': [1.0, 2.0, np.nan, 5.0, 3.0]})
+    current = pd.DataFrame({'codigo_interno': [2, 1, 3, 4, 6], 'descricao': list('babdf'),
+                            'loja_ativa_mix': ['003', '002-001', '007', '004', '009'],
+                            'estoque_cd': [2.0, 1.2, 4.0, 5.0, 1.0]})
+    delta = compare_snapshots(previous, current, min_estoque=0.5).set_index('codigo_interno')
+    assert dict(delta['mudanca']) == {6: ADDED, 5: REMOVED, 4: LOJAS, 3: BOTH}, dict(delta['mudanca'])
+    assert delta.loc[4, 'lojas_removidas'] == '005' and delta.loc[4, 'lojas_incluidas'] is None
+    assert delta.loc[3, 'lojas_incluidas'] == '007'
+    delta = compare_snapshots(previous, current).set_index('codigo_interno')
+    assert delta.loc[1, 'mudanca'] == ESTOQUE and np.isclose(delta.loc[1, 'estoque_cd_variacao'], 0.2)
+    assert compare_snapshots(previous, previous).empty, "changes found between identical snapshots"
+    print("added, removed, store sets and estoque_cd threshold: ok")
+
+
+def check_bad_snapshot():
+    """A corrupt or incompatible previous mix.parquet leaves no delta, and no exception."""
+    current = pd.DataFrame({'codigo_interno': [1, 2], 'descricao': ['a', 'b'],
+                            'loja_ativa_mix': ['001', '002'], 'estoque_cd': [1.0, 2.0]})
+    text_keys = current.astype({'codigo_interno': str})
+    text_keys.loc[1, 'codigo_interno'] = 'X2'
+    with tempfile.TemporaryDirectory() as out:
+        snapshot = os.path.join(out, 'mix.parquet')
+        write_delta(current, snapshot, out, log=lambda msg: None)
+        for name in (DELTA_PARQUET, DELTA_EXCEL):
+            open(os.path.join(out, name), 'wb').close()
+        cases = [('corrupt', lambda: open(snapshot, 'wb').write(b'not a parquet file')),
+                 ('text codigo_interno', lambda: text_keys.to_parquet(snapshot, index=False))]
+        for name, write_previous in cases:
+            write_previous()
+            lines = []
+            assert write_delta(current, snapshot, out, log=lines.append) is None, name
+            assert any('delta não gerado' in line for line in lines), (name, lines)
+            assert not os.path.exists(os.path.join(out, DELTA_PARQUET)), f"{name}: stale {DELTA_PARQUET} kept"
+    print("corrupt and incompatible previous snapshots: delta skipped, no error: ok")
+
+
+def bench(items, changes, repeat):
+    rng = np.random.default_rng(0)
+    previous = snapshot(items, rng)
+    current = previous.sample(frac=1, random_state=0).reset_index(drop=True)
+    changed = rng.choice(len(current), changes, replace=False)
+    current.loc[changed[:changes // 2], 'estoque_cd'] += 10
+    current.loc[changed[changes // 2:], 'loja_ativa_mix'] = '999'
+    current = current.iloc[changes // 10:]
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        delta = compare_snapshots(previous, current)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    counts = delta['mudanca'].value_counts()
+    print(f"{items:,} items, {len(delta):,} changes in {best * 1000:.0f} ms "
+          f"({', '.join(f'{k}: {v}' for k, v in counts.items() if v)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check delta.compare_snapshots and time it on a large mix.")
+    parser.add_argument('--items', type=int, default=1_000_000)
+    parser.add_argument('--changes', type=int, default=10_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    check_small()
+    check_bad_snapshot()
+    bench(args.items, args.changes, args.repeat)
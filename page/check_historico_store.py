@@ -0,0 +1,64 @@
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from engine import HISTORICO_PARQUET, process_workbook
+from historico_store import HISTORICO_STORE, read_store
+from synth_workbook import generate_workbook
+
+# Each run ingests the same workbook again, in a different mode
+MODES = [
+    ('file', {}),
+    ('dataset', {'parquet_layout': 'dataset'}),
+    ('chunked', {'chunked': True}),
+    ('chunked + dataset', {'chunked': True, 'parquet_layout': 'dataset'}),
+    ('file again', {}),
+]
+
+COUNTS_RE = re.compile(r'(\d+) novas, (\d+) alteradas, (\d+) inalteradas')
+
+
+def ingest_counts(workbook, output_dir, options):
+    """process_workbook with historico_store=True; returns the (novas, alteradas, inalteradas) it logged."""
+    lines = []
+    process_workbook(workbook, output_dir, log=lines.append, historico_store=True, sheet_cache=False,
+                     delta=False, **options)
+    found = [COUNTS_RE.search(line) for line in lines]
+    return tuple(int(n) for n in next(m for m in found if m).groups())
+
+
+def check(workbook, name):
+    with tempfile.TemporaryDirectory() as out:
+        rows = None
+        for mode, options in MODES:
+            new, changed, unchanged = ingest_counts(workbook, out, options)
+            if rows is None:
+                rows = len(pd.read_parquet(os.path.join(out, HISTORICO_PARQUET)))
+                assert (new, changed, unchanged) == (rows, 0, 0), (mode, new, changed, unchanged, rows)
+            else:
+                assert (new, changed) == (0, 0), f"{mode}: {new} novas, {changed} alteradas"
+            print(f"  {mode:<18} {new:>6} novas {changed:>6} alteradas {unchanged:>6} inalteradas")
+
+        stored = read_store(os.path.join(out, HISTORICO_STORE))
+        assert len(stored) == rows, f"{len(stored)} rows in the store, {rows} in the workbook"
+        assert pd.api.types.is_datetime64_any_dtype(stored['data_pedido']), stored['data_pedido'].dtype
+        print(f"{name}: every mode ingests as unchanged, {rows} rows kept: ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the same workbook into the historico store in every "
+                                                 "layout and chunked mode; nothing may come out new or changed.")
+    parser.add_argument('--workbook', default=os.path.join(ROOT, 'data', 'unificador.xlsm'))
+    parser.add_argument('--historico-rows', type=int, default=3000)
+    args = parser.parse_args()
+    check(args.workbook, os.path.basename(args.workbook))
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic = os.path.join(tmp, 'sintetica.xlsm')
+        generate_workbook(synthetic, mix_rows=300, lojas=5, wms_rows=500, historico_rows=args.historico_rows)
+        check(synthetic, 'synthetic workbook')
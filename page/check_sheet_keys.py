@@ -0,0 +1,81 @@
+import argparse
+import os
+import re
+import sys
+import tempfile
+import zipfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from loader import SHARED_STRINGS, STYLES, _sheet_parts, sheet_keys
+
+STRING_CELL_RE = re.compile(rb'(t="s"[^>]*>\s*<v>)(\d+)')
+OTHER_SHEETS = ('mix', 'item_ativo', 'historico')
+
+
+def rewrite(src, dst, edit):
+    """Copy the workbook src to dst, passing every part through edit(name, data, parts)."""
+    with zipfile.ZipFile(src) as archive:
+        parts = {part: sheet for sheet, part in _sheet_parts(archive).items()}
+        with zipfile.ZipFile(dst, 'w', zipfile.ZIP_DEFLATED) as out:
+            for info in archive.infolist():
+                out.writestr(info, edit(info.filename, archive.read(info.filename), parts))
+
+
+def new_wms_string(name, data, parts):
+    """A new string in wms, saved the way Excel may save it: first in sharedStrings, every index shifted."""
+    if name == SHARED_STRINGS:
+        return re.sub(rb'(<sst\b[^>]*>)', rb'\1<si><t>ENDERECO NOVO 01-02-03</t></si>', data, count=1)
+    if parts.get(name) is None:
+        return data
+    data = STRING_CELL_RE.sub(lambda m: m.group(1) + str(int(m.group(2)) + 1).encode(), data)
+    if parts[name] == 'wms':
+        # The last string cell of wms now holds the new text
+        last = list(STRING_CELL_RE.finditer(data))[-1]
+        data = data[:last.start(2)] + b'0' + data[last.end(2):]
+    return data
+
+
+def new_historico_format(workbook):
+    """Edit adding a cell style with another number format, used by the first historico cell of row 2 only."""
+    with zipfile.ZipFile(workbook) as archive:
+        style = int(re.search(rb'<cellXfs count="(\d+)"', archive.read(STYLES)).group(1))
+
+    def edit(name, data, parts):
+        if name == STYLES:
+            return re.sub(rb'<cellXfs count="\d+"(.*?)</cellXfs>',
+                          lambda m: f'<cellXfs count="{style + 1}"'.encode() + m.group(1)
+                          + b'<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+                          + b'</cellXfs>', data, count=1, flags=re.S)
+        if parts.get(name) == 'historico':
+            cell = re.search(rb'<c r="[A-Z]+2"( s="\d+")?', data)
+            return data[:cell.start()] + cell.group(0).split(b' s=')[0] + f' s="{style}"'.encode() + data[cell.end():]
+        return data
+    return edit
+
+
+def check(workbook):
+    with tempfile.TemporaryDirectory() as tmp:
+        edited = os.path.join(tmp, 'texto.xlsm')
+        rewrite(workbook, edited, new_wms_string)
+        before, after = sheet_keys(workbook), sheet_keys(edited)
+        assert before['wms'] != after['wms'], "wms edited but its key didn't change"
+        for sheet in OTHER_SHEETS:
+            assert before[sheet] == after[sheet], f"'{sheet}' key changed by a new string in wms"
+        print("new string in wms, every shared string renumbered: only the wms key changed: ok")
+
+        formatted = os.path.join(tmp, 'formato.xlsm')
+        rewrite(workbook, formatted, new_historico_format(workbook))
+        after = sheet_keys(formatted)
+        assert before['historico'] != after['historico'], "new number format in historico not seen"
+        for sheet in ('mix', 'item_ativo', 'wms'):
+            assert before[sheet] == after[sheet], f"'{sheet}' key changed by a format used only in historico"
+        print("new number format in one historico cell: only the historico key changed: ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that editing one sheet of a workbook changes only that "
+                                                 "sheet's loader.sheet_keys entry.")
+    parser.add_argument('--workbook', default=os.path.join(ROOT, 'data', 'unificador.xlsm'))
+    args = parser.parse_args()
+    check(args.workbook)
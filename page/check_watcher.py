@@ -0,0 +1,83 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from synth_workbook import generate_workbook
+from watcher import DONE, Watcher
+
+SETTLE = 5.0
+
+
+def quiet(msg):
+    pass
+
+
+def write_partially(src, dst):
+    """Copy the first half of src to dst, as a slow network copy would leave it."""
+    with open(src, 'rb') as f:
+        data = f.read()
+    with open(dst, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+
+def settle(watcher, t):
+    """Scan at t and once the settle time has passed; returns the paths queued."""
+    return watcher.scan(t) + watcher.scan(t + SETTLE)
+
+
+def check(workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        inbox, out = os.path.join(tmp, 'entrada'), os.path.join(tmp, 'saida')
+        os.makedirs(inbox)
+        first, second = os.path.join(tmp, 'a.xlsm'), os.path.join(tmp, 'b.xlsm')
+        generate_workbook(first, mix_rows=200, lojas=3, wms_rows=300, historico_rows=300)
+        generate_workbook(second, mix_rows=300, lojas=3, wms_rows=300, historico_rows=300)
+        target = os.path.join(inbox, 'unificador.xlsm')
+        options = {'sheet_cache': False}
+
+        watcher = Watcher(inbox, out, workers, SETTLE, log=quiet, **options)
+        write_partially(first, target)
+        assert watcher.scan(0) == [], "queued a file seen for the first time"
+        assert watcher.scan(SETTLE) == [], "queued a partially written workbook"
+        shutil.copyfile(first, target)
+        assert watcher.scan(SETTLE + 1) == [], "queued a file still changing"
+        assert watcher.scan(SETTLE + 2) == [], "queued a file before it settled"
+        assert watcher.scan(2 * SETTLE + 1) == [target], "settled workbook not queued"
+        watcher.dispatch()
+        watcher.drain()
+        runs = watcher.journal.runs(target)
+        assert [r['status'] for r in runs] == [DONE], runs
+        assert os.path.exists(runs[0]['output']), runs[0]['output']
+        watcher.close()
+        print("debounce and first run: ok")
+
+        # A restart finds the run in the journal, even after the file is rewritten unchanged
+        watcher = Watcher(inbox, out, workers, SETTLE, log=quiet, **options)
+        assert settle(watcher, 0) == [], "reprocessed after a restart"
+        shutil.copyfile(first, target)
+        assert settle(watcher, 100) == [], "reprocessed an identical copy"
+        print("restart and identical copy skipped: ok")
+
+        # New content, plus a second workbook, are processed side by side
+        shutil.copyfile(second, target)
+        shutil.copyfile(first, os.path.join(inbox, 'outra.xlsm'))
+        queued = settle(watcher, 200)
+        assert sorted(queued) == sorted([target, os.path.join(inbox, 'outra.xlsm')]), queued
+        watcher.dispatch()
+        assert len(watcher.running) == min(workers, 2) and len(watcher.queue) == 2 - min(workers, 2)
+        watcher.drain()
+        statuses = [r['status'] for r in watcher.journal.runs()]
+        assert statuses == [DONE] * 3, statuses
+        watcher.close()
+        print(f"changed and new workbooks processed with {workers} worker(s): ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise the watch-folder mode against a temporary directory.")
+    parser.add_argument('-j', '--workers', type=int, default=2)
+    args = parser.parse_args()
+    check(args.workers)
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+from engine import compute_estoque_cd, consolidate_lojas, format_mix
+from loader import load_sheets
+from schema import apply_schemas
+from synth_workbook import make_frames, parse_scale, scale_sizes
+
+
+def quiet(msg):
+    pass
+
+
+def sheet_memory(frames):
+    return {sheet: df.memory_usage(deep=True).sum() / 1024 / 1024 for sheet, df in frames.items()}
+
+
+def time_merges(frames, repeat=3):
+    """Best time of the two merge stages (loja_ativa_mix and estoque_cd)."""
+    best = None
+    for _ in range(repeat):
+        df_mix = format_mix(frames['mix'].copy(), quiet)
+        start = time.perf_counter()
+        df_mix = consolidate_lojas(df_mix, frames['item_ativo'], quiet)
+        compute_estoque_cd(df_mix, frames['wms'], quiet)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare(frames):
+    before = sheet_memory(frames)
+    t_before = time_merges(frames)
+    compact, violations = apply_schemas({k: v.copy() for k, v in frames.items()}, quiet)
+    after = sheet_memory(compact)
+    t_after = time_merges(compact)
+
+    print(f"{'sheet':<12}{'rows':>12}{'before':>12}{'after':>12}{'saved':>8}")
+    for sheet in frames:
+        saved = 1 - after[sheet] / before[sheet] if before[sheet] else 0
+        print(f"{sheet:<12}{len(frames[sheet]):>12,}{before[sheet]:>10.1f}MB{after[sheet]:>10.1f}MB{saved:>8.0%}")
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"{'total':<12}{'':>12}{total_before:>10.1f}MB{total_after:>10.1f}MB{1 - total_after / total_before:>8.0%}")
+    print(f"merges (loja_ativa_mix + estoque_cd): {t_before:.3f}s -> {t_after:.3f}s")
+    for v in violations:
+        print(f"violation: {v}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory of the loaded sheets before and after the compact schema.")
+    parser.add_argument('--workbook', help="measure a real workbook instead of synthetic sheets")
+    parser.add_argument('--scale', default='1m', help="synthetic scale: 10k, 100k, 1m, 10m or a row count")
+    args = parser.parse_args()
+    if args.workbook:
+        frames, _ = load_sheets(args.workbook, log=quiet)
+    else:
+        frames = make_frames(**scale_sizes(parse_scale(args.scale)))
+    compare(frames)
@@ -0,0 +1,145 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from writer import MAX_ROWS, write_excel
+
+CHUNK_ROWS = 100_000
+LOJAS = 20
+
+# Benchmark scales: rows in each of item_ativo, wms and historico
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+
+def _items(mix_rows):
+    return np.arange(1_000_000, 1_000_000 + mix_rows)
+
+
+def make_mix(mix_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    items = _items(mix_rows)
+    return pd.DataFrame({
+        'codigo_interno': items,
+        'codigo_ean': 7_890_000_000_000 + rng.integers(0, 10_000_000, mix_rows),
+        'descricao': [f'PRODUTO {i}' for i in items],
+        'embalagem': rng.choice([1, 6, 12, 24], mix_rows),
+        'origem': rng.choice(['nestle', 'outros'], mix_rows),
+        'loja_ativa_mix': None,
+        'estoque_cd': np.nan,
+        'total_estoque': np.nan,
+    })
+
+
+def iter_item_ativo(mix_rows, lojas, seed=1):
+    # One row per item x store, like the ERP export
+    rng = np.random.default_rng(seed)
+    items = np.repeat(_items(mix_rows), lojas)
+    stores = np.tile(np.arange(1, lojas + 1), mix_rows)
+    for start in range(0, len(items), CHUNK_ROWS):
+        n = min(CHUNK_ROWS, len(items) - start)
+        yield pd.DataFrame({
+            'codigo_interno': items[start:start + n],
+            'descricao': 'PRODUTO',
+            'loja': stores[start:start + n],
+            'status': rng.choice(['A', 'I'], n, p=[0.8, 0.2]),
+        })
+
+
+def iter_wms(mix_rows, wms_rows, seed=2):
+    rng = np.random.default_rng(seed)
+    for start in range(0, wms_rows, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, wms_rows - start)
+        yield pd.DataFrame({
+            'codigo_interno': rng.choice(_items(mix_rows), n),
+            'descricao': 'PRODUTO',
+            'endereco': [f'R{a:02d}-{b:03d}' for a, b in zip(rng.integers(1, 40, n), rng.integers(1, 500, n))],
+            'estoque': rng.integers(0, 500, n).astype('float64'),
+            'validade': '31/12/26',
+            'data de entrada do lote': pd.Timestamp('2025-11-20') + pd.to_timedelta(rng.integers(0, 10, n), unit='D'),
+        })
+
+
+def iter_historico(mix_rows, lojas, historico_rows, seed=3):
+    rng = np.random.default_rng(seed)
+    for start in range(0, historico_rows, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, historico_rows - start)
+        yield pd.DataFrame({
+            'codigo_interno': rng.choice(_items(mix_rows), n),
+            'loja': rng.integers(1, lojas + 1, n),
+            'situacao': rng.integers(1, 8, n),
+            'etoque_cx': rng.random(n) * 10,
+            'pedido_do_dia_cx': rng.integers(0, 5, n).astype('float64'),
+            'venda_ultima_semana': rng.random(n) * 5,
+            'venda_penultima_semana': rng.random(n) * 5,
+            'media_semanal_mes': rng.random(n) * 5,
+            'capacidade_gondola': rng.random(n) * 3,
+            'data_pedido': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 330, n), unit='D'),
+        })
+
+
+def parse_scale(scale):
+    """'100k', '1m' or a plain row count -> number of rows."""
+    scale = str(scale).lower()
+    if scale in SCALES:
+        return SCALES[scale]
+    return int(scale.replace('_', ''))
+
+
+def scale_sizes(rows, lojas=LOJAS):
+    """Sheet sizes for a benchmark scale: item_ativo, wms and historico get ~rows rows each."""
+    return {'mix_rows': max(rows // lojas, 1), 'lojas': lojas, 'wms_rows': rows, 'historico_rows': rows}
+
+
+def fits_excel(sizes):
+    """Whether every sheet of the given sizes fits in an Excel sheet."""
+    biggest = max(sizes['mix_rows'] * sizes['lojas'], sizes['wms_rows'], sizes['historico_rows'])
+    return biggest < MAX_ROWS
+
+
+def make_frames(mix_rows=10_000, lojas=20, wms_rows=10_000, historico_rows=10_000):
+    """The same synthetic sheets as DataFrames, as load() would return them."""
+    return {
+        'mix': make_mix(mix_rows),
+        'item_ativo': pd.concat(iter_item_ativo(mix_rows, lojas), ignore_index=True),
+        'wms': pd.concat(iter_wms(mix_rows, wms_rows), ignore_index=True),
+        'historico': pd.concat(iter_historico(mix_rows, lojas, historico_rows), ignore_index=True),
+    }
+
+
+def generate_workbook(path, mix_rows=10_000, lojas=20, wms_rows=10_000, historico_rows=10_000):
+    """Write a unificador.xlsm-shaped workbook with mix, item_ativo, wms and historico.
+
+    item_ativo has mix_rows x lojas rows. Sheets are generated and written in
+    chunks, so multi-million-row workbooks don't need the data in memory.
+    Each sheet must fit Excel's limit of 1,048,575 data rows.
+    """
+    sizes = {'mix_rows': mix_rows, 'lojas': lojas, 'wms_rows': wms_rows, 'historico_rows': historico_rows}
+    if not fits_excel(sizes):
+        raise ValueError(f"Sheets are limited to {MAX_ROWS - 1} rows: {sizes}")
+    write_excel(path, {
+        'mix': make_mix(mix_rows),
+        'historico': iter_historico(mix_rows, lojas, historico_rows),
+        'wms': iter_wms(mix_rows, wms_rows),
+        'item_ativo': iter_item_ativo(mix_rows, lojas),
+    })
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic unificador workbook.")
+    parser.add_argument('output')
+    parser.add_argument('--scale', help=f"preset sizes: {', '.join(SCALES)} or a row count (overrides the options below)")
+    parser.add_argument('--mix-rows', type=int, default=10_000)
+    parser.add_argument('--lojas', type=int, default=LOJAS)
+    parser.add_argument('--wms-rows', type=int, default=10_000)
+    parser.add_argument('--historico-rows', type=int, default=10_000)
+    args = parser.parse_args()
+    if args.scale:
+        generate_workbook(args.output, **scale_sizes(parse_scale(args.scale), args.lojas))
+    else:
+        generate_workbook(args.output, args.mix_rows, args.lojas, args.wms_rows, args.historico_rows)
+    print(f"Wrote {args.output}")
@@ -0,0 +1,279 @@
+"""Per-stage timing and memory instrumentation, and the JSON run report.
+
+process_workbook wraps each pipeline stage in RunReport.stage(), which
+records wall time, CPU time, peak RSS and the stage's input/output row
+counts. RSS is sampled from a background thread while the stage runs
+(psutil when installed, /proc/self/statm otherwise), so the peak is the
+stage's own rather than the process-wide high-water mark.
+
+profile='cprofile' also profiles the whole run into run_profile.prof;
+profile='tracemalloc' adds the peak of Python-level allocations per stage.
+
+launch_time() tells how long the program took to become usable (the GUI
+window, the imports of the command line); the caller passes those figures
+to RunReport as `startup`. This module only imports the standard library, so
+it can be imported first thing at startup.
+"""
+import cProfile
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+RUN_REPORT = 'run_report.json'
+RUN_PROFILE = 'run_profile.prof'
+PROFILERS = ('cprofile', 'tracemalloc')
+
+SAMPLE_INTERVAL = 0.01
+
+MB = 1024 * 1024
+
+# Seconds between 1601-01-01 (Windows FILETIME epoch) and 1970-01-01
+FILETIME_EPOCH = 11644473600
+
+# Fallback for launch_time when the process start can't be read
+_IMPORTED_AT = time.time()
+
+STARTUP_LABELS = {'window_s': 'janela aberta', 'libraries_s': 'bibliotecas carregadas', 'ready_s': 'pronto'}
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if it can't be read."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def process_peak_rss():
+    """Peak RSS of this process so far in bytes, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _windows_start_time(pid):
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+    if not handle:
+        return None
+    try:
+        times = [wintypes.FILETIME() for _ in range(4)]
+        if not kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+            return None
+        created = times[0].dwHighDateTime << 32 | times[0].dwLowDateTime
+        # FILETIME counts 100 ns intervals
+        return created / 1e7 - FILETIME_EPOCH
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def process_start_time(pid=None):
+    """Creation time of process pid (default: this one) as a Unix timestamp, or None."""
+    pid = pid or os.getpid()
+    try:
+        import psutil
+        return psutil.Process(pid).create_time()
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    if sys.platform == 'win32':
+        return _windows_start_time(pid)
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Fields after the command name; starttime is field 22 of the line
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        # Both in seconds since boot (btime in /proc/stat only has whole seconds)
+        return time.time() - uptime + int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def is_onefile():
+    """Whether this is a one-file PyInstaller build (unpacked into a _MEI temp folder at each start)."""
+    bundle = getattr(sys, '_MEIPASS', None)
+    return bool(getattr(sys, 'frozen', False) and bundle and os.path.basename(bundle).startswith('_MEI'))
+
+
+def launch_time():
+    """When the program was started, as a Unix timestamp.
+
+    In a one-file build that is the start of the bootloader, our parent
+    process, which unpacks the bundle before Python even starts.
+    """
+    start = process_start_time(os.getppid() if is_onefile() else None)
+    return start or _IMPORTED_AT
+
+
+def startup_info(**seconds):
+    """The `startup` section of the run report: the given durations plus how the program was built."""
+    info = {name: round(value, 3) for name, value in seconds.items() if value is not None}
+    info['frozen'] = bool(getattr(sys, 'frozen', False))
+    info['onefile'] = is_onefile()
+    return info
+
+
+class RssSampler:
+    """Polls RSS from a daemon thread and keeps the highest value seen."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        if self.peak is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.peak is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+
+def _mb(n):
+    return None if n is None else round(n / MB, 1)
+
+
+class RunReport:
+    """Collects stage measurements for one run and writes them as JSON.
+
+    Use as:
+
+        report = RunReport(input_file, options)
+        with report.stage('format_mix', rows_in=len(df)) as stage:
+            df = format_mix(df)
+            stage['rows_out'] = len(df)
+        report.finish(output_dir, log)
+    """
+
+    def __init__(self, input_file=None, options=None, profile=None, startup=None):
+        self.input_file = input_file
+        self.options = options or {}
+        self.startup = startup
+        self.profile = profile or ()
+        unknown = set(self.profile) - set(PROFILERS)
+        if unknown:
+            raise ValueError(f"Perfilador desconhecido: {', '.join(sorted(unknown))}")
+        self.stages = []
+        self.started_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._profiler = None
+        if 'cprofile' in self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if 'tracemalloc' in self.profile and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Measure the enclosed block; the yielded dict takes 'rows_out' and any extras."""
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None}
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        with RssSampler() as sampler:
+            try:
+                yield record
+            except BaseException:
+                # The run is over: don't leave the profilers on (the GUI process lives on)
+                self._stop_profilers()
+                raise
+            finally:
+                record['wall_s'] = round(time.perf_counter() - wall, 3)
+                record['cpu_s'] = round(time.process_time() - cpu, 3)
+                record['peak_rss_mb'] = _mb(sampler.peak)
+                if tracemalloc.is_tracing():
+                    record['traced_peak_mb'] = _mb(tracemalloc.get_traced_memory()[1])
+                self.stages.append(record)
+
+    def to_dict(self):
+        return {
+            'input': self.input_file,
+            'started_at': self.started_at,
+            'options': self.options,
+            'profile': list(self.profile),
+            'startup': self.startup,
+            'wall_s': round(time.perf_counter() - self._wall, 3),
+            'cpu_s': round(time.process_time() - self._cpu, 3),
+            'peak_rss_mb': _mb(process_peak_rss()),
+            'stages': self.stages,
+        }
+
+    def summary_lines(self):
+        """The stage measurements as a fixed-width table, one string per line."""
+        header = f"{'Etapa':<20}{'Tempo':>9}{'CPU':>9}{'RSS pico':>10}{'Entrada':>11}{'Saída':>11}"
+        lines = [header, '-' * len(header)]
+        for s in self.stages:
+            rss = '-' if s['peak_rss_mb'] is None else f"{s['peak_rss_mb']:.0f} MB"
+            rows_in = '-' if s['rows_in'] is None else f"{s['rows_in']:,}"
+            rows_out = '-' if s['rows_out'] is None else f"{s['rows_out']:,}"
+            lines.append(f"{s['stage']:<20}{s['wall_s']:>8.2f}s{s['cpu_s']:>8.2f}s{rss:>10}{rows_in:>11}{rows_out:>11}")
+        total = self.to_dict()
+        lines.append('-' * len(header))
+        lines.append(f"{'Total':<20}{total['wall_s']:>8.2f}s{total['cpu_s']:>8.2f}s")
+        return lines
+
+    def _stop_profilers(self, profile_path=None):
+        if self._profiler is not None:
+            self._profiler.disable()
+            if profile_path:
+                self._profiler.dump_stats(profile_path)
+            self._profiler = None
+        if 'tracemalloc' in self.profile and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def finish(self, output_dir, log=print):
+        """Stop the profilers, write run_report.json (and run_profile.prof) and log the summary."""
+        self._stop_profilers(os.path.join(output_dir, RUN_PROFILE))
+
+        report = self.to_dict()
+        path = os.path.join(output_dir, RUN_REPORT)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        log("Resumo por etapa:")
+        for line in self.summary_lines():
+            log("  " + line)
+        timings = [f"{label} em {self.startup[key]:.2f}s" for key, label in STARTUP_LABELS.items()
+                   if self.startup and key in self.startup]
+        if timings:
+            log(f"  Inicialização do programa: {', '.join(timings)}")
+        log(f"  ✓ Relatório salvo: {RUN_REPORT}")
+        if 'cprofile' in self.profile:
+            log(f"  ✓ Perfil salvo: {RUN_PROFILE} (python -m pstats {RUN_PROFILE})")
+        return report
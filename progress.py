@@ -0,0 +1,83 @@
+"""Progress reporting and cancellation for long-running stages.
+
+The engine reports progress through a Progress object: start() at the
+beginning of a stage, advance() as rows are read or written. Every call
+also checks the cancel event and raises Cancelled when it is set, so a
+stage stops at its next batch rather than running to the end.
+NoProgress is the do-nothing stand-in used by the command line.
+"""
+import time
+
+# Minimum time between two events sent to the callback
+EMIT_INTERVAL = 0.1
+
+
+class Cancelled(Exception):
+    """Raised inside the pipeline when the user cancels the run."""
+
+
+class NoProgress:
+    def start(self, stage, total=None):
+        pass
+
+    def advance(self, rows=0, fraction=None):
+        pass
+
+    def check(self):
+        pass
+
+
+class Progress:
+    """Tracks the current stage and sends progress events to callback.
+
+    callback receives a dict with 'stage', 'rows' (done so far), 'percent'
+    (None when the total is unknown) and 'rate' (rows per second). It is
+    called from the worker thread, at most every EMIT_INTERVAL seconds, so it
+    should only hand the event over (e.g. put it in a queue).
+    """
+
+    def __init__(self, callback=None, cancel_event=None):
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self.stage = None
+        self.total = None
+        self.rows = 0
+        self.fraction = None
+        self._start = self._last_emit = time.perf_counter()
+
+    def check(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise Cancelled("Processamento cancelado pelo usuário")
+
+    def start(self, stage, total=None):
+        """Begin a stage; total is its number of rows, if known."""
+        self.check()
+        self.stage = stage
+        self.total = total
+        self.rows = 0
+        self.fraction = None
+        self._start = time.perf_counter()
+        self._emit(force=True)
+
+    def advance(self, rows=0, fraction=None):
+        """Count rows more as done; fraction overrides rows/total for the percentage."""
+        self.check()
+        self.rows += rows
+        if fraction is not None:
+            self.fraction = fraction
+        self._emit(force=fraction is not None)
+
+    def _emit(self, force=False):
+        now = time.perf_counter()
+        if self.callback is None or (not force and now - self._last_emit < EMIT_INTERVAL):
+            return
+        self._last_emit = now
+        if self.fraction is not None:
+            percent = 100 * self.fraction
+        elif self.total:
+            percent = min(100, 100 * self.rows / self.total)
+        else:
+            percent = None
+        elapsed = now - self._start
+        self.callback({'stage': self.stage, 'rows': self.rows, 'percent': percent,
+                       'rate': self.rows / elapsed if elapsed > 0 else 0})
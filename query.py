@@ -0,0 +1,237 @@
+"""Lazy queries over the processed Parquet outputs.
+
+Questions like "estoque_cd of item X" or "orders em falta in store Y last
+week" don't need the whole Excel output loaded. scan() opens mix.parquet,
+historico.parquet (or the partitioned historico/ dataset), wms_resumo.parquet,
+lojas_ativas.parquet or delta.parquet as a pyarrow dataset without reading it; select(),
+where() and between() only build up the column list and the filter
+expression. to_pandas() then reads just those columns, and the filter is
+pushed down into the scan, so row groups (and, in the dataset layout, month
+and store folders) whose statistics rule the filter out are skipped.
+
+In historico.parquet data_pedido is kept as dd/mm/yy text, which can't be
+compared by range inside the scan; the date range is then applied to the
+rows the other filters kept. The dataset layout stores real dates, and a
+date range also restricts the 'mes' partitions read.
+
+Command line: python engine.py query SAIDA mix --where codigo_interno=1012475
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from dataset import HISTORICO_DATASET, open_historico_dataset
+from delta import DELTA_PARQUET
+from engine import HISTORICO_PARQUET, LOJAS_PARQUET, MIX_PARQUET, WMS_SUMMARY_PARQUET
+from formatters import LOJA_WIDTH
+
+TABLES = {'mix': MIX_PARQUET, 'historico': HISTORICO_PARQUET, 'wms': WMS_SUMMARY_PARQUET, 'lojas': LOJAS_PARQUET,
+          'delta': DELTA_PARQUET}
+DATE_COLUMN = 'data_pedido'
+DISPLAY_DATE = '%d/%m/%y'
+INPUT_DATES = ('%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y')
+FORMATS = ('tabela', 'csv', 'json')
+
+
+def open_table(output_dir, table):
+    """The dataset of one output table in output_dir (nothing is read yet)."""
+    if table not in TABLES:
+        raise ValueError(f"Tabela desconhecida: '{table}' (use {', '.join(TABLES)})")
+    if table == 'historico' and os.path.isdir(os.path.join(output_dir, HISTORICO_DATASET)):
+        return open_historico_dataset(os.path.join(output_dir, HISTORICO_DATASET))
+    path = os.path.join(output_dir, TABLES[table])
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{TABLES[table]} não encontrado em {output_dir}")
+    return ds.dataset(path, format='parquet')
+
+
+def parse_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    for fmt in INPUT_DATES:
+        try:
+            return datetime.datetime.strptime(str(value), fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Data inválida: '{value}' (use AAAA-MM-DD ou DD/MM/AA)")
+
+
+def _timestamp(date):
+    return pa.scalar(datetime.datetime.combine(date, datetime.time()), pa.timestamp('s'))
+
+
+def _typed(column, arrow_type, value):
+    """value (e.g. text from the command line) converted to the column's type."""
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if pa.types.is_integer(arrow_type):
+        return int(value)
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    if pa.types.is_date(arrow_type):
+        return parse_date(value)
+    value = str(value)
+    if column == 'loja' and value.isdigit():
+        # Stores are written zero-padded ('004'); accept 4 as well
+        value = value.zfill(LOJA_WIDTH)
+    return value
+
+
+class Query:
+    """A lazy selection of columns and rows from one output table; see the module docstring.
+
+    Every method returns a new Query; nothing is read until to_table,
+    to_pandas or count.
+    """
+
+    def __init__(self, dataset, columns=None, expression=None, dates=(None, None)):
+        self.dataset = dataset
+        self.columns = columns
+        self.expression = expression
+        self.dates = dates
+
+    def _derive(self, **changes):
+        state = {'columns': self.columns, 'expression': self.expression, 'dates': self.dates, **changes}
+        return Query(self.dataset, **state)
+
+    def _field_type(self, column):
+        if column not in self.dataset.schema.names:
+            raise ValueError(f"Coluna desconhecida: '{column}' (disponíveis: {', '.join(self.dataset.schema.names)})")
+        return self.dataset.schema.field(column).type
+
+    def select(self, *columns):
+        """Only read these columns."""
+        for column in columns:
+            self._field_type(column)
+        return self._derive(columns=list(columns))
+
+    def where(self, **values):
+        """Rows where each column equals its value, or is one of its values if a list is given."""
+        expression = self.expression
+        for column, value in values.items():
+            arrow_type = self._field_type(column)
+            if isinstance(value, (list, tuple, set)):
+                condition = ds.field(column).isin([_typed(column, arrow_type, v) for v in value])
+            else:
+                condition = ds.field(column) == _typed(column, arrow_type, value)
+            expression = condition if expression is None else expression & condition
+        return self._derive(expression=expression)
+
+    def between(self, start=None, end=None):
+        """Rows whose data_pedido falls from start to end, both included (either may be None)."""
+        arrow_type = self._field_type(DATE_COLUMN)
+        start = parse_date(start) if start is not None else None
+        end = parse_date(end) if end is not None else None
+        if not pa.types.is_date(arrow_type):
+            # Text dates: filtered after the scan, see to_table
+            return self._derive(dates=(start, end))
+
+        # The 'mes' conditions let the scan skip whole month folders
+        partitioned = 'mes' in self.dataset.schema.names
+        conditions = []
+        if start is not None:
+            conditions.append(ds.field(DATE_COLUMN) >= start)
+            if partitioned:
+                conditions.append(ds.field('mes') >= start.strftime('%Y-%m'))
+        if end is not None:
+            conditions.append(ds.field(DATE_COLUMN) <= end)
+            if partitioned:
+                conditions.append(ds.field('mes') <= end.strftime('%Y-%m'))
+        expression = self.expression
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return self._derive(expression=expression)
+
+    def to_table(self, limit=None):
+        """Read the selected columns of the matching rows as an Arrow table."""
+        columns = self.columns or self.dataset.schema.names
+        start, end = self.dates
+        if start is None and end is None:
+            if limit is not None:
+                return self.dataset.head(limit, columns=columns, filter=self.expression)
+            return self.dataset.to_table(columns=columns, filter=self.expression)
+
+        scan_columns = columns if DATE_COLUMN in columns else columns + [DATE_COLUMN]
+        table = self.dataset.to_table(columns=scan_columns, filter=self.expression)
+        dates = pc.strptime(table[DATE_COLUMN], format=DISPLAY_DATE, unit='s', error_is_null=True)
+        keep = pc.is_valid(dates)
+        if start is not None:
+            keep = pc.and_(keep, pc.greater_equal(dates, _timestamp(start)))
+        if end is not None:
+            keep = pc.and_(keep, pc.less_equal(dates, _timestamp(end)))
+        table = table.filter(keep).select(columns)
+        return table if limit is None else table.slice(0, limit)
+
+    def to_pandas(self, limit=None):
+        return self.to_table(limit).to_pandas()
+
+    def count(self):
+        if self.dates == (None, None):
+            return self.dataset.count_rows(filter=self.expression)
+        return self.select(DATE_COLUMN).to_table().num_rows
+
+
+def scan(output_dir, table):
+    """A Query over all rows and columns of table (one of TABLES) in output_dir."""
+    return Query(open_table(output_dir, table))
+
+
+def _parse_where(items):
+    """{'col': value or [values]} from 'col=value' or 'col=v1,v2' strings."""
+    values = {}
+    for item in items:
+        column, sep, value = item.partition('=')
+        if not sep or not column:
+            raise ValueError(f"Filtro inválido: '{item}' (use coluna=valor)")
+        values[column.strip()] = value.split(',') if ',' in value else value
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='engine.py query',
+                                     description="Consulta as saídas em Parquet sem abrir o Excel processado.")
+    parser.add_argument('output', help="diretório com as saídas do processamento")
+    parser.add_argument('table', choices=TABLES, help="tabela consultada")
+    parser.add_argument('-w', '--where', action='append', default=[], metavar='COLUNA=VALOR',
+                        help="filtro de igualdade; vários valores separados por vírgula (pode ser repetido)")
+    parser.add_argument('--desde', help="historico: pedidos a partir desta data (AAAA-MM-DD ou DD/MM/AA)")
+    parser.add_argument('--ate', help="historico: pedidos até esta data")
+    parser.add_argument('-c', '--colunas', help="colunas exibidas, separadas por vírgula (padrão: todas)")
+    parser.add_argument('-n', '--limite', type=int, help="número máximo de linhas")
+    parser.add_argument('--formato', choices=FORMATS, default='tabela')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        query = scan(args.output, args.table)
+        if args.colunas:
+            query = query.select(*[c.strip() for c in args.colunas.split(',')])
+        query = query.where(**_parse_where(args.where))
+        if args.desde or args.ate:
+            query = query.between(args.desde, args.ate)
+        df = query.to_pandas(args.limite)
+    except (OSError, ValueError, pa.ArrowInvalid) as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    if args.formato == 'csv':
+        df.to_csv(sys.stdout, index=False)
+    elif args.formato == 'json':
+        print(df.to_json(orient='records', force_ascii=False, date_format='iso'))
+    else:
+        print(df.to_string(index=False) if len(df) else "(nenhuma linha)")
+    print(f"{len(df)} linhas em {elapsed * 1000:.0f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Declared column types for the input sheets.
+
+read_excel gives every sheet pandas' defaults: int64 for codes and stores,
+float64 for quantities, str for the rest. apply_schemas converts the
+declared columns to compact types right after loading, which cuts the
+memory of the large sheets and makes the merges on codigo_interno cheaper.
+Text columns need no conversion: from pandas 3 (the minimum in
+requirements.txt) str is Arrow-backed, where pandas 2 kept Python objects.
+
+A column is only converted when every value fits its declared type. Text in
+a numeric column, fractional store codes or blank item codes are reported
+as schema violations (with the Excel rows involved) and the column is left
+exactly as read, instead of being silently coerced. float32 is used only
+where it is lossless, so every value written back out stays the same.
+"""
+import numpy as np
+import pandas as pd
+
+# Candidate names for the stock quantity column in 'wms', matched case-insensitively
+QTY_COLUMNS = ['qtde', 'quantidade', 'saldo', 'estoque', 'total']
+
+SCHEMAS = {
+    'mix': {'codigo_interno': 'int32', 'embalagem': 'int16', 'origem': 'category'},
+    'item_ativo': {'codigo_interno': 'int32', 'loja': 'int16', 'status': 'category'},
+    'wms': {'codigo_interno': 'int32', **{col: 'float32' for col in QTY_COLUMNS}},
+    'historico': {
+        'codigo_interno': 'int32',
+        'loja': 'int16',
+        'situacao': 'int8',
+        'etoque_cx': 'float32',
+        'pedido_do_dia_cx': 'float32',
+        'venda_ultima_semana': 'float32',
+        'venda_penultima_semana': 'float32',
+        'media_semanal_mes': 'float32',
+        'capacidade_gondola': 'float32',
+    },
+}
+
+# Columns that identify a row: a blank value is a violation, not just missing data
+KEY_COLUMNS = ('codigo_interno',)
+
+# Excel row of the first data row (row 1 is the header)
+FIRST_ROW = 2
+MAX_EXAMPLES = 5
+
+
+def _numeric(series):
+    """(numeric values, mask of non-blank values that aren't numbers)."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series, np.zeros(len(series), dtype=bool)
+    values = pd.to_numeric(series, errors='coerce')
+    blank = series.isna() | series.astype(str).str.strip().eq('')
+    return values, (values.isna() & ~blank).to_numpy()
+
+
+def convert_column(series, dtype, key=False):
+    """Convert series to dtype; returns (converted series or None, problem, bad row mask).
+
+    None means the column must stay as it is: either a violation (problem is
+    set and the mask flags the offending rows) or a value range that doesn't
+    fit the compact type (problem is None).
+    """
+    if dtype == 'category':
+        return series.astype('category'), None, None
+
+    values, bad = _numeric(series)
+    if bad.any():
+        return None, "valores não numéricos", bad
+    if key and values.isna().any():
+        return None, "valores vazios", values.isna().to_numpy()
+
+    if dtype.startswith('int'):
+        present = values.dropna()
+        fractional = (present % 1 != 0).reindex(values.index, fill_value=False).to_numpy()
+        if fractional.any():
+            return None, "valores não inteiros", fractional
+        if values.isna().any():
+            # Blank cells: keep the floats pandas read rather than a nullable type
+            return None, None, None
+        info = np.iinfo(dtype)
+        if len(values) and (values.min() < info.min or values.max() > info.max):
+            return None, None, None
+        return values.astype(dtype), None, None
+
+    compact = values.astype('float32')
+    if not np.array_equal(compact.to_numpy(dtype='float64'), values.to_numpy(dtype='float64'), equal_nan=True):
+        return None, None, None
+    return compact, None, None
+
+
+def apply_schema(df, schema, sheet, log=print):
+    """Convert the declared columns of one sheet; returns (df, violations)."""
+    violations = []
+    by_name = {str(col).lower(): col for col in df.columns}
+    for name, dtype in schema.items():
+        col = by_name.get(name)
+        if col is None or df[col].dtype == dtype:
+            continue
+        converted, problem, bad = convert_column(df[col], dtype, key=name in KEY_COLUMNS)
+        if converted is not None:
+            df[col] = converted
+        elif problem:
+            rows = (df.index[bad][:MAX_EXAMPLES] + FIRST_ROW).tolist()
+            violations.append({'sheet': sheet, 'column': str(col), 'problem': problem,
+                               'count': int(bad.sum()), 'rows': rows})
+            log(f"  ⚠ '{sheet}'.'{col}': {bad.sum()} {problem} (linhas {', '.join(map(str, rows))}"
+                f"{', ...' if bad.sum() > len(rows) else ''}); coluna mantida como foi lida")
+    return df, violations
+
+
+def memory_mb(frames):
+    return sum(df.memory_usage(deep=True).sum() for df in frames.values()) / 1024 / 1024
+
+
+def apply_schemas(frames, log=print, schemas=None):
+    """Apply SCHEMAS (or the given schemas) to every loaded sheet; returns (frames, violations)."""
+    schemas = SCHEMAS if schemas is None else schemas
+    log("⏳ Aplicando tipos compactos...")
+    before = memory_mb(frames)
+    violations = []
+    for sheet, df in frames.items():
+        if sheet in schemas and not df.empty:
+            frames[sheet], found = apply_schema(df, schemas[sheet], sheet, log)
+            violations.extend(found)
+    log(f"  ✓ Memória das planilhas: {before:.1f} MB -> {memory_mb(frames):.1f} MB")
+    return frames, violations
@@ -0,0 +1,175 @@
+"""Columnar cache of parsed workbook sheets, shared across runs.
+
+Parsing the xlsm XML is the slowest part of a run, and analysts often
+reprocess the same workbook several times a day, usually after editing a
+single sheet. The first run stores every parsed sheet as an uncompressed
+Arrow IPC (Feather v2) file; later runs memory-map it instead of parsing
+the sheet again.
+
+An entry holds one sheet and is keyed by loader.sheet_keys: the raw
+worksheet XML inside the xlsx zip, with the shared strings and number
+formats it refers to. A sheet edited since the last run gets a new key and
+is parsed again, while the untouched sheets of the same file (or of a copy
+elsewhere) are still read from the cache. Entries live in one directory
+each, with a meta.json whose mtime records the last use; once the cache
+grows past max_mb the least recently used entries are removed. Sheets that
+Arrow can't represent (mixed-type object columns) are simply not cached and
+keep being read from the workbook.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from loader import sheet_keys
+
+DEFAULT_MAX_MB = 2048
+META = 'meta.json'
+HASH_BLOCK = 1024 * 1024
+
+
+def cache_root():
+    """Per-user Unificador cache folder (LOCALAPPDATA on Windows, ~/.cache elsewhere)."""
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'Unificador')
+
+
+def default_cache_dir():
+    return os.path.join(cache_root(), 'planilhas')
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class SheetCache:
+    """Get and put parsed sheets of a workbook; see the module docstring."""
+
+    def __init__(self, cache_dir=None, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_mb * 1024 * 1024
+
+    def _entry_dir(self, sheet, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(f"{sheet}|{key}".encode('utf-8')).hexdigest()[:32])
+
+    def get(self, input_file, sheets, log=print, keys=None):
+        """Cached sheets of input_file among sheets, as a dict name -> DataFrame.
+
+        keys are the sheet_keys of input_file, computed here if not given.
+        """
+        keys = sheet_keys(input_file, sheets) if keys is None else keys
+        frames = {}
+        for sheet in sheets:
+            if sheet not in keys:
+                continue
+            entry = self._entry_dir(sheet, keys[sheet])
+            path = os.path.join(entry, sheet + '.arrow')
+            if not os.path.exists(path):
+                continue
+            start = time.perf_counter()
+            try:
+                frames[sheet] = feather.read_table(path, memory_map=True).to_pandas()
+            except (OSError, pa.ArrowInvalid):
+                continue
+            log(f"  ↺ '{sheet}' lida do cache ({len(frames[sheet])} linhas, {time.perf_counter() - start:.2f}s)")
+            # Mark the entry as recently used
+            try:
+                os.utime(os.path.join(entry, META))
+            except OSError:
+                pass
+        return frames
+
+    def put(self, input_file, frames, log=print, keys=None):
+        """Store the given sheets of input_file, then evict old entries if over the size limit.
+
+        keys are the sheet_keys of input_file, computed here if not given;
+        a sheet without a key is not stored.
+        """
+        keys = sheet_keys(input_file, list(frames)) if keys is None else keys
+        path = os.path.abspath(input_file)
+        stored, entries = [], []
+        for sheet, df in frames.items():
+            if len(df.columns) == 0 or sheet not in keys:
+                continue
+            try:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                log(f"  ⚠ '{sheet}' não pode ser guardada no cache (colunas com tipos misturados)")
+                continue
+            entry = self._entry_dir(sheet, keys[sheet])
+            os.makedirs(entry, exist_ok=True)
+            sheet_path = os.path.join(entry, sheet + '.arrow')
+            # Uncompressed, so reads can map the file instead of decoding it
+            feather.write_feather(table, sheet_path + '.tmp', compression='uncompressed')
+            os.replace(sheet_path + '.tmp', sheet_path)
+            meta_path = os.path.join(entry, META)
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'path': path, 'sheet': sheet, 'key': keys[sheet]}, f)
+            os.replace(meta_path + '.tmp', meta_path)
+            stored.append(sheet)
+            entries.append(entry)
+
+        if stored:
+            log(f"  ✓ Planilhas guardadas no cache: {', '.join(stored)}")
+        self.evict(log, keep=entries)
+
+    def entries(self):
+        """(last used, size in bytes, directory) of every entry, least recently used first."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        found = []
+        for name in os.listdir(self.cache_dir):
+            entry = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(entry):
+                continue
+            # An entry without meta.json was interrupted while being written
+            meta_path = os.path.join(entry, META)
+            used = os.path.getmtime(meta_path if os.path.exists(meta_path) else entry)
+            found.append((used, _dir_size(entry), entry))
+        return sorted(found)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, log=print, keep=()):
+        """Remove least recently used entries until the cache fits in max_mb.
+
+        Entries in keep (the ones just written) stay even if they alone are too big.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry in keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            log(f"  ↺ Cache: entrada antiga removida ({size / 1024 / 1024:.0f} MB)")
+
+    def clear(self):
+        """Remove every entry; returns the number of bytes freed."""
+        freed = 0
+        for _, size, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+            freed += size
+        return freed
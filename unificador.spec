@@ -1,4 +1,27 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+# pyinstaller unificador.spec              -> dist/Unificador.exe (um arquivo)
+# pyinstaller unificador.spec -- --onedir  -> dist/Unificador/Unificador.exe (uma pasta)
+#
+# The one-file exe unpacks everything into a temp folder at every start; the
+# one-folder build starts faster since nothing is unpacked.
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--onedir', action='store_true')
+options = parser.parse_args()
+
+# Never imported by the app; left to the analysis they end up in the bundle
+# through optional imports of pandas, numpy and pyarrow
+EXCLUDES = [
+    'matplotlib', 'scipy', 'IPython', 'notebook', 'jupyter_client', 'ipykernel',
+    'pytest', '_pytest', 'hypothesis', 'sqlalchemy', 'psycopg2', 'pymysql',
+    'numba', 'numexpr', 'bottleneck', 'tables', 'xlrd', 'pyxlsb', 'odf',
+    'fsspec', 's3fs', 'gcsfs', 'botocore', 'boto3',
+    'jinja2', 'bs4', 'html5lib', 'tabulate', 'PIL',
+    'pandas.tests', 'numpy.tests', 'numpy.f2py', 'pyarrow.tests',
+    'tkinter.test', 'unittest', 'pydoc_data', 'lib2to3', 'setuptools', 'pip',
+]
 
 
 a = Analysis(
@@ -10,29 +33,58 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=EXCLUDES,
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='Unificador',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-)
+if options.onedir:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='Unificador',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='Unificador',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='Unificador',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        # UPX-compressed DLLs have to be decompressed at every start
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+    )
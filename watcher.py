@@ -0,0 +1,239 @@
+"""Watch-folder mode: process workbooks as they are dropped into a folder.
+
+The ERP writes a fresh unificador.xlsm to a shared folder several times a
+day. Watcher polls the folder (notifications are unreliable on network
+shares), waits until a workbook has kept the same size and mtime for
+`settle` seconds and opens as a complete zip, then queues it. Up to
+`workers` workbooks are processed at a time in worker processes, each into
+its own subfolder of output_dir as in process_directory.
+
+Every run is recorded in a SQLite journal in output_dir. A workbook whose
+size and mtime, or whose content hash, match a finished run is not
+processed again, so restarting the watcher doesn't redo earlier work. Runs
+left 'running' by a crash are redone on the next start. A failed run is
+retried only once the file changes.
+"""
+import os
+import signal
+import sqlite3
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import _process_one, list_workbooks
+from sheet_cache import file_hash
+
+JOURNAL = '.unificador_journal.sqlite'
+DEFAULT_SETTLE = 10.0
+DEFAULT_INTERVAL = 2.0
+
+RUNNING, DONE, FAILED = 'running', 'done', 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    status TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    output TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_path ON runs (path);
+"""
+
+
+class Journal:
+    """Runs of the watcher, one row per workbook version processed."""
+
+    def __init__(self, path):
+        self.path = path
+        # Created by whichever thread builds the Watcher, used by the one running it
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def start(self, path, size, mtime_ns, sha256):
+        """Record a run as started; returns its id."""
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO runs (path, size, mtime_ns, sha256, status, started) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, sha256, RUNNING, time.time()))
+        return cur.lastrowid
+
+    def finish(self, run_id, output=None, error=None):
+        with self.db:
+            self.db.execute("UPDATE runs SET status = ?, finished = ?, output = ?, error = ? WHERE id = ?",
+                            (FAILED if error else DONE, time.time(), output, error, run_id))
+
+    def finished(self, path, size=None, mtime_ns=None, sha256=None):
+        """Whether this version of path (same size and mtime, or same content) already ran to the end."""
+        row = self.db.execute(
+            "SELECT 1 FROM runs WHERE path = ? AND status != ? AND ((size = ? AND mtime_ns = ?) OR sha256 = ?) "
+            "LIMIT 1", (path, RUNNING, size, mtime_ns, sha256)).fetchone()
+        return row is not None
+
+    def runs(self, path=None):
+        """All runs (of path, if given) as dicts, oldest first."""
+        query = "SELECT * FROM runs" + (" WHERE path = ?" if path else "") + " ORDER BY id"
+        cur = self.db.execute(query, (path,) if path else ())
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def _ignore_interrupt():
+    # Workers finish their workbook on Ctrl+C; the watcher decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _complete(path):
+    """Whether path reads as a whole workbook (an xlsm/xlsx is a zip; a partial copy isn't)."""
+    try:
+        with zipfile.ZipFile(path) as zf:
+            return zf.testzip() is None
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+class Watcher:
+    """Poll input_dir and process new or changed workbooks; see the module docstring.
+
+    Extra keyword options are passed on to process_workbook.
+    """
+
+    def __init__(self, input_dir, output_dir=None, workers=1, settle=DEFAULT_SETTLE, interval=DEFAULT_INTERVAL,
+                 journal=None, log=print, **options):
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = output_dir or input_dir
+        self.workers = max(1, workers or 1)
+        self.settle = settle
+        self.interval = interval
+        self.log = log
+        self.options = options
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.journal = Journal(journal or os.path.join(self.output_dir, JOURNAL))
+        self.pool = None
+        self.queue = deque()  # (path, stamp, sha256) waiting for a worker
+        self.running = {}  # future -> (run id, path)
+        self._seen = {}  # path -> ((size, mtime_ns), first seen with that stamp)
+        self._known = {}  # path -> stamp already handled (queued, processed or skipped)
+
+    def scan(self, now=None):
+        """Check the folder once: queue workbooks that have settled. Returns the paths queued."""
+        now = time.monotonic() if now is None else now
+        queued = []
+        present = set()
+        for path in list_workbooks(self.input_dir):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            present.add(path)
+            stamp = (st.st_size, st.st_mtime_ns)
+            if self._known.get(path) == stamp:
+                continue
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != stamp:
+                # New or still being written: restart the debounce
+                self._seen[path] = (stamp, now)
+                continue
+            if now - seen[1] < self.settle or self._is_busy(path):
+                continue
+            if not _complete(path):
+                self._seen[path] = (stamp, now)
+                continue
+
+            self._known[path] = stamp
+            sha256 = file_hash(path)
+            if self.journal.finished(path, *stamp, sha256):
+                self.log(f"  ↺ {os.path.basename(path)} já processada, ignorada")
+                continue
+            self.queue.append((path, stamp, sha256))
+            queued.append(path)
+            self.log(f"⏳ {os.path.basename(path)} na fila")
+
+        for path in set(self._seen) - present:
+            # Removed (or renamed) before it settled
+            self._seen.pop(path)
+            self._known.pop(path, None)
+        return queued
+
+    def _is_busy(self, path):
+        """Whether path is queued or being processed (a change is picked up once it's done)."""
+        return any(p == path for p, _, _ in self.queue) or any(p == path for _, p in self.running.values())
+
+    def dispatch(self):
+        """Start queued workbooks while fewer than `workers` are running."""
+        while self.queue and len(self.running) < self.workers:
+            path, (size, mtime_ns), sha256 = self.queue.popleft()
+            run_id = self.journal.start(path, size, mtime_ns, sha256)
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupt)
+            stem = os.path.splitext(os.path.basename(path))[0]
+            future = self.pool.submit(_process_one, path, os.path.join(self.output_dir, stem), self.options)
+            self.running[future] = (run_id, path)
+
+    def collect(self):
+        """Record the runs that finished; returns how many did."""
+        done = [f for f in self.running if f.done()]
+        for future in done:
+            run_id, path = self.running.pop(future)
+            try:
+                output = future.result()
+            except Exception as e:
+                self.journal.finish(run_id, error=str(e) or type(e).__name__)
+                self.log(f"✗ {os.path.basename(path)}: {e}")
+            else:
+                self.journal.finish(run_id, output=output)
+                self.log(f"✓ {os.path.basename(path)} -> {output}")
+        return len(done)
+
+    def step(self, now=None):
+        """One polling round: scan, record finished runs, start queued ones."""
+        self.scan(now)
+        self.collect()
+        self.dispatch()
+
+    def drain(self):
+        """Wait for every queued and running workbook to finish."""
+        while self.queue or self.running:
+            self.collect()
+            self.dispatch()
+            time.sleep(0.05)
+
+    def run(self, stop=None):
+        """Poll until stop (a threading.Event) is set or Ctrl+C.
+
+        Workbooks already running are finished and recorded first; queued
+        ones are left for the next start. A second Ctrl+C stops at once, and
+        the interrupted runs are redone on the next start.
+        """
+        self.log(f"⏳ Observando {self.input_dir} (a cada {self.interval:g}s, {self.workers} em paralelo). "
+                 "Ctrl+C para parar.")
+        try:
+            while not (stop and stop.is_set()):
+                self.step()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            self.log("  … Interrompido")
+        try:
+            self.queue.clear()
+            if self.running:
+                self.log("  … Aguardando os processamentos em andamento")
+            while self.running:
+                self.collect()
+                time.sleep(0.05)
+        finally:
+            self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        self.journal.close()
@@ -0,0 +1,291 @@
+"""WMS stock aggregation driven by a layout config.
+
+WMS exports differ between warehouses and over time: the quantity column
+may be called qtde, saldo or estoque, and some rows (blocked addresses,
+reserve positions) should not count towards an item's stock. A layout
+describes the sheet; every key is optional:
+
+    {
+        "qty_column": "estoque",
+        "address_column": "endereco",
+        "unit": "units",
+        "filters": [{"column": "endereco", "op": "not_startswith", "value": ["AV", "BLQ"]}],
+        "address_types": {"picking": ["PBL", "0CS"]},
+        "default_address_type": "reserva",
+        "aggregates": ["sum", "rows", "addresses", "min", "max"]
+    }
+
+qty_column and address_column left out (or null) are detected from the
+header: known names first, then, for the quantity, the only numeric column
+left. Detection results are kept per header signature (the column names) in
+the user's cache folder, so later runs on the same layout skip it. unit is
+"units" when the quantity must still be divided by the mix 'embalagem', or
+"boxes" when it already is in boxes. address_types classifies addresses by
+prefix; the min/max aggregates are then also given per type.
+
+summarize_wms makes a single grouped pass over the WMS rows, by item and
+address; the per-item figures are reductions of that much smaller table.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import QTY_COLUMNS
+from sheet_cache import cache_root
+
+ADDRESS_COLUMNS = ['endereco', 'endereço', 'posicao', 'posição', 'local']
+
+UNITS = ('units', 'boxes')
+AGGREGATES = ('sum', 'rows', 'addresses', 'min', 'max')
+
+DEFAULT_LAYOUT = {
+    'qty_column': None,
+    'address_column': None,
+    'unit': 'units',
+    'filters': [],
+    'address_types': {},
+    'default_address_type': 'outros',
+    'aggregates': list(AGGREGATES),
+}
+
+FILTER_OPS = {
+    'in': lambda s, v: s.isin(_as_list(v)),
+    'not_in': lambda s, v: ~s.isin(_as_list(v)),
+    'startswith': lambda s, v: s.astype(str).str.startswith(tuple(map(str, _as_list(v)))),
+    'not_startswith': lambda s, v: ~s.astype(str).str.startswith(tuple(map(str, _as_list(v)))),
+    '==': lambda s, v: s == v,
+    '!=': lambda s, v: s != v,
+    '>': lambda s, v: pd.to_numeric(s, errors='coerce') > v,
+    '>=': lambda s, v: pd.to_numeric(s, errors='coerce') >= v,
+    '<': lambda s, v: pd.to_numeric(s, errors='coerce') < v,
+    '<=': lambda s, v: pd.to_numeric(s, errors='coerce') <= v,
+}
+
+REDUCERS = {'sum': np.add, 'min': np.minimum, 'max': np.maximum}
+
+LAYOUT_CACHE = 'layouts_wms.json'
+MAX_CACHED_LAYOUTS = 100
+# Part of the header signature: bump when detect_columns picks differently
+DETECTION_VERSION = 2
+
+
+def _as_list(value):
+    return value if isinstance(value, (list, tuple)) else [value]
+
+
+def load_layout(layout=None):
+    """DEFAULT_LAYOUT completed with layout (a dict or the path of a JSON file), validated."""
+    if isinstance(layout, str):
+        with open(layout, encoding='utf-8') as f:
+            layout = json.load(f)
+    layout = layout or {}
+    unknown = set(layout) - set(DEFAULT_LAYOUT)
+    if unknown:
+        raise ValueError(f"Chaves desconhecidas no layout do WMS: {', '.join(sorted(unknown))}")
+    result = {**DEFAULT_LAYOUT, **layout}
+    if result['unit'] not in UNITS:
+        raise ValueError(f"Unidade inválida no layout do WMS: '{result['unit']}' (use {' ou '.join(UNITS)})")
+    bad = [a for a in result['aggregates'] if a not in AGGREGATES]
+    if bad:
+        raise ValueError(f"Agregados desconhecidos no layout do WMS: {', '.join(bad)}")
+    for f in result['filters']:
+        if f.get('op') not in FILTER_OPS or 'column' not in f:
+            raise ValueError(f"Filtro inválido no layout do WMS: {f}")
+    return result
+
+
+def header_signature(df_wms):
+    names = [str(col).strip().lower() for col in df_wms.columns]
+    return hashlib.sha256(json.dumps([DETECTION_VERSION, names]).encode('utf-8')).hexdigest()[:32]
+
+
+class LayoutCache:
+    """Detected columns per WMS header signature, in a JSON file shared across runs."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(cache_root(), LAYOUT_CACHE)
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, signature):
+        return self._read().get(signature)
+
+    def put(self, signature, detected):
+        layouts = self._read()
+        layouts.pop(signature, None)
+        layouts[signature] = detected
+        # Oldest first, as inserted
+        for old in list(layouts)[:-MAX_CACHED_LAYOUTS]:
+            del layouts[old]
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(layouts, f, indent=2)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError:
+            pass
+
+
+def _find_column(df, name):
+    """The column of df called name, compared case-insensitively, or None."""
+    by_name = {str(col).strip().lower(): col for col in df.columns}
+    return by_name.get(str(name).strip().lower())
+
+
+def detect_columns(df_wms):
+    """{'qty_column', 'address_column', 'qty_by_content'} detected from the sheet.
+
+    The quantity is the first sheet column with a known name, in sheet
+    order, as the original script picked it.
+    """
+    address_col = next((c for c in map(lambda n: _find_column(df_wms, n), ADDRESS_COLUMNS) if c is not None), None)
+    qty_col = next((col for col in df_wms.columns if str(col).strip().lower() in QTY_COLUMNS), None)
+    by_content = False
+    if qty_col is None:
+        # No known name: accept the only numeric column besides the item code
+        candidates = [col for col in df_wms.columns
+                      if str(col).lower() != 'codigo_interno' and col != address_col
+                      and pd.api.types.is_numeric_dtype(df_wms[col]) and not pd.api.types.is_bool_dtype(df_wms[col])]
+        if len(candidates) == 1:
+            qty_col, by_content = candidates[0], True
+    return {'qty_column': qty_col, 'address_column': address_col, 'qty_by_content': by_content}
+
+
+def resolve_layout(df_wms, layout=None, log=print, layouts=None):
+    """Layout config with the columns it leaves out detected, or from layouts (a LayoutCache).
+
+    Returns None when no quantity column can be found.
+    """
+    layout = load_layout(layout)
+    for key in ('qty_column', 'address_column'):
+        if layout[key] is not None and _find_column(df_wms, layout[key]) is None:
+            raise ValueError(f"Coluna '{layout[key]}' do layout não encontrada no WMS")
+        if layout[key] is not None:
+            layout[key] = _find_column(df_wms, layout[key])
+
+    if layout['qty_column'] is None or layout['address_column'] is None:
+        signature = header_signature(df_wms)
+        detected = layouts.get(signature) if layouts is not None else None
+        if detected:
+            log("  ↺ Layout do WMS reconhecido (cabeçalho já visto)")
+        else:
+            detected = detect_columns(df_wms)
+            if detected['qty_by_content']:
+                log(f"  ⚠ Nenhuma coluna de quantidade conhecida; usando a única coluna numérica, "
+                    f"'{detected['qty_column']}'")
+            if layouts is not None and detected['qty_column'] is not None:
+                layouts.put(signature, {key: None if detected[key] is None else str(detected[key])
+                                        for key in ('qty_column', 'address_column')})
+        for key in ('qty_column', 'address_column'):
+            if layout[key] is None and detected[key] is not None:
+                layout[key] = _find_column(df_wms, detected[key])
+
+    if layout['qty_column'] is None:
+        return None
+    return layout
+
+
+def filter_mask(df_wms, filters):
+    """Rows of df_wms kept by every filter."""
+    keep = pd.Series(True, index=df_wms.index)
+    for f in filters:
+        col = _find_column(df_wms, f['column'])
+        if col is None:
+            raise ValueError(f"Coluna '{f['column']}' do filtro não encontrada no WMS")
+        keep &= FILTER_OPS[f['op']](df_wms[col], f.get('value')).fillna(False).astype(bool)
+    return keep
+
+
+def address_type(addresses, address_types, default):
+    """Type of each address: the position in address_types of the first type
+    with a matching prefix, default otherwise."""
+    text = pd.Series(addresses).astype(str)
+    types = np.full(len(text), default, dtype='int64')
+    assigned = np.zeros(len(text), dtype=bool)
+    for position, prefixes in enumerate(address_types.values()):
+        match = text.str.startswith(tuple(map(str, _as_list(prefixes)))).to_numpy() & ~assigned
+        types[match] = position
+        assigned |= match
+    return types
+
+
+def summarize_wms(df_wms, layout, aggregates=None):
+    """One row per codigo_interno with the aggregates of its WMS stock.
+
+    layout is a resolved layout (see resolve_layout); aggregates overrides
+    its list ('sum' is always computed, as total_estoque). Columns:
+    total_estoque, n_linhas, n_enderecos, min_estoque and max_estoque (the
+    smallest and largest stock at one address) plus min_estoque_<type> and
+    max_estoque_<type> when address types are configured.
+    """
+    aggregates = set(layout['aggregates'] if aggregates is None else aggregates) | {'sum'}
+    keep = filter_mask(df_wms, layout['filters'])
+    rows = df_wms[keep] if not keep.all() else df_wms
+    # Compact on load, but totals are summed in full precision
+    qty = pd.to_numeric(rows[layout['qty_column']], errors='coerce').astype('float64')
+    address_col = layout['address_column']
+
+    if aggregates == {'sum'}:
+        total = qty.groupby(rows['codigo_interno']).sum()
+        return pd.DataFrame({'codigo_interno': total.index, 'total_estoque': total.to_numpy()})
+
+    item_codes, items = pd.factorize(rows['codigo_interno'], sort=True)
+    present = item_codes >= 0
+    item_codes, qty = item_codes[present].astype('int64'), np.nan_to_num(qty.to_numpy()[present])
+    if not len(qty):
+        return pd.DataFrame({'codigo_interno': items[:0], 'total_estoque': np.zeros(0)})
+
+    # The single pass over the WMS rows: stock and row count per (item, address),
+    # sorted by item. Blank addresses (code -1) make one group of their own per item.
+    type_names = list(layout['address_types']) + [layout['default_address_type']]
+    if address_col is not None:
+        address_codes, addresses = pd.factorize(rows[address_col])
+        width = len(addresses) + 1
+        pair_codes, pairs = pd.factorize(item_codes * width + address_codes[present] + 1, sort=True)
+        per_address_qty = np.bincount(pair_codes, weights=qty, minlength=len(pairs))
+        per_address_rows = np.bincount(pair_codes, minlength=len(pairs))
+        item, address = pairs // width, pairs % width - 1
+        # Type of each address, looked up on the unique addresses only
+        types = np.append(address_type(addresses, layout['address_types'], len(type_names) - 1),
+                          len(type_names) - 1)[address]
+    else:
+        # Without addresses, every row stands for its own position
+        order = np.argsort(item_codes, kind='stable')
+        item, per_address_qty = item_codes[order], qty[order]
+        per_address_rows, address, types = np.ones(len(item), dtype='int64'), None, None
+
+    starts = np.flatnonzero(np.r_[True, item[1:] != item[:-1]])
+    summary = pd.DataFrame({'codigo_interno': items[item[starts]],
+                            'total_estoque': np.add.reduceat(per_address_qty, starts)})
+    if 'rows' in aggregates:
+        summary['n_linhas'] = np.add.reduceat(per_address_rows, starts)
+    if 'addresses' in aggregates and address is not None:
+        summary['n_enderecos'] = np.add.reduceat((address >= 0).astype('int64'), starts)
+    for agg in ('min', 'max'):
+        if agg in aggregates:
+            summary[f'{agg}_estoque'] = REDUCERS[agg].reduceat(per_address_qty, starts)
+
+    if layout['address_types'] and address is not None:
+        # Same reductions per (item, type); items without a type get NaN
+        row = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(item)]))
+        group_codes, groups = pd.factorize(row * len(type_names) + types, sort=True)
+        order = np.argsort(group_codes, kind='stable')
+        group_starts = np.flatnonzero(np.r_[True, np.diff(group_codes[order]) != 0])
+        for agg in ('min', 'max'):
+            if agg not in aggregates:
+                continue
+            values = REDUCERS[agg].reduceat(per_address_qty[order], group_starts)
+            for t, name in enumerate(type_names):
+                column = np.full(len(summary), np.nan)
+                of_type = groups % len(type_names) == t
+                column[groups[of_type] // len(type_names)] = values[of_type]
+                summary[f'{agg}_estoque_{name}'] = column
+    return summary
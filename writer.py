@@ -0,0 +1,168 @@
+"""Streaming Excel writer for the processed workbook.
+
+pd.ExcelWriter(engine='openpyxl') keeps every cell of every sheet in memory
+as an openpyxl object until the file is saved. Here rows are pushed to the
+sheet XML in chunks instead: with xlsxwriter (constant_memory mode) when it is
+installed, otherwise with an openpyxl write-only workbook. Memory stays flat
+regardless of the number of rows.
+"""
+import itertools
+
+import pandas as pd
+
+CHUNK_ROWS = 50_000
+# Rows between two progress callbacks
+PROGRESS_ROWS = 5_000
+
+# Excel's sheet size limit, header row included
+MAX_ROWS = 1_048_576
+
+# Codes that must stay text in Excel (leading zeros, 14-digit EANs)
+TEXT_COLUMNS = ('codigo_ean', 'loja', 'loja_ativa_mix')
+DATE_FORMAT = 'dd/mm/yy'
+
+
+def default_engine():
+    try:
+        import xlsxwriter  # noqa: F401
+        return 'xlsxwriter'
+    except ImportError:
+        return 'openpyxl'
+
+
+def _column_values(series):
+    # Python values with None for blanks, which both engines write as empty cells
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def iter_row_chunks(df, chunk_rows=CHUNK_ROWS):
+    """Yield lists of row tuples, converting only chunk_rows rows at a time."""
+    for start in range(0, len(df), chunk_rows):
+        block = df.iloc[start:start + chunk_rows]
+        yield list(zip(*(_column_values(block[col]) for col in block.columns)))
+
+
+def _iter_rows(name, frames, chunk_rows, progress=None):
+    # Like pandas, refuse to write past the sheet limit rather than truncate
+    written = 1
+    for frame in frames:
+        written += len(frame)
+        if written > MAX_ROWS:
+            raise ValueError(f"Planilha '{name}' excede o limite de {MAX_ROWS - 1} linhas do Excel")
+        for rows in iter_row_chunks(frame, chunk_rows):
+            if not progress:
+                yield from rows
+                continue
+            for start in range(0, len(rows), PROGRESS_ROWS):
+                block = rows[start:start + PROGRESS_ROWS]
+                yield from block
+                progress(len(block))
+
+
+def _sheet_frames(data):
+    """Accept a DataFrame or an iterable of DataFrame chunks for a sheet.
+
+    Returns (first frame, iterator over all frames); the first frame, which
+    gives the header and column formats, is None for an empty iterable.
+    """
+    if isinstance(data, pd.DataFrame):
+        return data, iter([data])
+    frames = iter(data)
+    first = next(frames, None)
+    if first is None:
+        return None, iter([])
+    return first, itertools.chain([first], frames)
+
+
+def _column_kinds(df):
+    kinds = []
+    for col in df.columns:
+        if col in TEXT_COLUMNS:
+            kinds.append('text')
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            kinds.append('date')
+        else:
+            kinds.append(None)
+    return kinds
+
+
+def _write_openpyxl(output_file, sheets, chunk_rows, progress):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    for name, data in sheets.items():
+        ws = wb.create_sheet(name)
+        df, frames = _sheet_frames(data)
+        if df is None:
+            continue
+        header = []
+        for col in df.columns:
+            cell = WriteOnlyCell(ws, value=str(col))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        ws.append(header)
+
+        formats = {'text': '@', 'date': DATE_FORMAT}
+        styled = [(i, formats[kind]) for i, kind in enumerate(_column_kinds(df)) if kind]
+        for row in _iter_rows(name, frames, chunk_rows, progress):
+            if styled:
+                row = list(row)
+                for i, number_format in styled:
+                    cell = WriteOnlyCell(ws, value=row[i])
+                    cell.number_format = number_format
+                    row[i] = cell
+            ws.append(row)
+    wb.save(output_file)
+
+
+def _write_xlsxwriter(output_file, sheets, chunk_rows, progress):
+    import xlsxwriter
+
+    wb = xlsxwriter.Workbook(output_file, {'constant_memory': True, 'nan_inf_to_errors': True})
+    header_format = wb.add_format({'bold': True})
+    formats = {'text': wb.add_format({'num_format': '@'}), 'date': wb.add_format({'num_format': DATE_FORMAT})}
+    try:
+        for name, data in sheets.items():
+            ws = wb.add_worksheet(name)
+            df, frames = _sheet_frames(data)
+            if df is None:
+                continue
+            ws.write_row(0, 0, [str(col) for col in df.columns], header_format)
+            kinds = _column_kinds(df)
+            r = 1
+            for row in _iter_rows(name, frames, chunk_rows, progress):
+                for c, value in enumerate(row):
+                    if value is None:
+                        continue
+                    kind = kinds[c]
+                    if kind == 'text':
+                        ws.write_string(r, c, str(value), formats['text'])
+                    elif kind == 'date':
+                        ws.write_datetime(r, c, value.to_pydatetime(), formats['date'])
+                    else:
+                        ws.write(r, c, value)
+                r += 1
+    finally:
+        wb.close()
+
+
+def write_excel(output_file, sheets, engine=None, chunk_rows=CHUNK_ROWS, progress=None):
+    """Write an ordered dict of sheet name -> DataFrame to output_file.
+
+    A sheet may also be given as an iterable of DataFrame chunks (e.g. read
+    back from Parquet batch by batch), so it never has to be whole in memory.
+
+    Code columns (TEXT_COLUMNS) are stored as text and datetime columns as
+    dates formatted dd/mm/yy. engine is 'xlsxwriter' or 'openpyxl'; by
+    default xlsxwriter is used when installed. progress, if given, is called
+    every PROGRESS_ROWS rows with the number of rows just written.
+    """
+    engine = engine or default_engine()
+    if engine == 'xlsxwriter':
+        _write_xlsxwriter(output_file, sheets, chunk_rows, progress)
+    elif engine == 'openpyxl':
+        _write_openpyxl(output_file, sheets, chunk_rows, progress)
+    else:
+        raise ValueError(f"Unknown Excel engine: {engine}")